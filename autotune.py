@@ -0,0 +1,185 @@
+"""
+Throughput autotuner for the number of tracks processed at once.
+
+BatchDownloader gates submissions through a ConcurrencyLimiter. While a job runs,
+ThroughputAutotuner measures completed tracks/sec and the error rate over a
+sliding window and hill-climbs the limiter between its bounds: it keeps moving
+in one direction while the score improves, turns around once if the very first
+step made things worse, then settles on the best level it saw. Too many errors
+make it settle one level below the failing one. A large drop in throughput
+after settling starts a new search.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class ConcurrencyLimiter:
+    """Counting gate whose limit can be changed while tasks are in flight"""
+
+    def __init__(self, limit):
+        self._limit = limit
+        self._active = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        return self._limit
+
+    def set_limit(self, limit):
+        with self._cond:
+            self._limit = limit
+            self._cond.notify_all()
+
+    def acquire(self):
+        with self._cond:
+            while self._active >= self._limit:
+                self._cond.wait()
+            self._active += 1
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+
+class ThroughputAutotuner:
+    def __init__(self, limiter, min_workers, max_workers, window_seconds=120, interval_seconds=10,
+                 max_error_rate=0.2, improvement=0.05, reprobe_drop=0.3, log=print):
+        self.limiter = limiter
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.window_seconds = window_seconds
+        self.interval_seconds = interval_seconds
+        self.max_error_rate = max_error_rate
+        self.improvement = improvement
+        self.reprobe_drop = reprobe_drop
+        self.log = log
+
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._level_since = time.monotonic()
+        self._direction = 1
+        self._reversed = False
+        self._settled = False
+        self._best_level = limiter.limit
+        self._best_score = None
+        # First level measured in the current search; only from there is turning around worthwhile
+        self._search_start = limiter.limit
+        self._stop = threading.Event()
+        self._paused = threading.Event()
+        self._thread = None
+
+    # ----- measurements -----
+    def record(self, success):
+        with self._lock:
+            self._events.append((time.monotonic(), bool(success)))
+
+    def _window(self):
+        now = time.monotonic()
+        since = max(now - self.window_seconds, self._level_since)
+        with self._lock:
+            while self._events and self._events[0][0] < now - self.window_seconds:
+                self._events.popleft()
+            samples = [ok for t, ok in self._events if t >= since]
+        elapsed = now - since
+        return samples, elapsed
+
+    # ----- control loop -----
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval_seconds + 1)
+
+    def pause(self):
+        self._paused.set()
+
+    def resume(self):
+        # Idle time (e.g. the pause between batches) must not count against the current level
+        with self._lock:
+            self._events.clear()
+        self._level_since = time.monotonic()
+        self._paused.clear()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_seconds):
+            if not self._paused.is_set():
+                self.step()
+
+    def step(self):
+        samples, elapsed = self._window()
+        level = self.limiter.limit
+        # Wait for a full window and enough completions to judge this level
+        if elapsed < self.window_seconds or len(samples) < max(level, 3):
+            return
+
+        errors = samples.count(False)
+        error_rate = errors / len(samples)
+        throughput = (len(samples) - errors) / elapsed
+        score = throughput
+
+        if error_rate > self.max_error_rate and level > self.min_workers:
+            # Settle below the failing level; climbing again would only return to it
+            self._settled = True
+            self._best_level = level - 1
+            self._best_score = None
+            self._move(level - 1, f"error rate {error_rate:.0%} at {level} workers, backing off to {level - 1}")
+            return
+
+        if self._settled:
+            if self._best_score is None:
+                # First full window after backing off: the baseline for spotting a later drop
+                self._best_score = score
+            elif score < self._best_score * (1 - self.reprobe_drop):
+                self._settled = False
+                self._reversed = False
+                self._best_score = None
+                self._direction = 1
+                self._move(level, f"throughput fell to {throughput:.2f} tracks/s, searching again")
+            return
+
+        if self._best_score is None or score > self._best_score * (1 + self.improvement):
+            first = self._best_score is None
+            if first:
+                self._search_start = level
+            self._best_score = score
+            self._best_level = level
+            target = level + self._direction
+            if not self.min_workers <= target <= self.max_workers:
+                # Only turn around when starting at a bound; after a climb the level
+                # behind this one was already measured and was worse
+                if not first or self._reversed:
+                    return self._settle(throughput)
+                self._direction = -self._direction
+                self._reversed = True
+                target = self._best_level + self._direction
+            if not self.min_workers <= target <= self.max_workers:
+                return self._settle(throughput)
+            self._move(target, f"{throughput:.2f} tracks/s at {level} workers (new best), trying {target}")
+            return
+
+        # No improvement at this level. Turning around only pays off from the level the
+        # search started at; after a climb the level below the best was already worse.
+        if not self._reversed and self._best_level == self._search_start:
+            self._direction = -self._direction
+            self._reversed = True
+            target = self._best_level + self._direction
+            if self.min_workers <= target <= self.max_workers:
+                self._move(target, f"{throughput:.2f} tracks/s at {level} workers (no gain), trying {target}")
+                return
+        self._settle(throughput)
+
+    def _settle(self, throughput):
+        self._settled = True
+        self._move(self._best_level, f"settled on {self._best_level} workers "
+                                     f"({self._best_score:.2f} tracks/s best, {throughput:.2f} last)")
+
+    def _move(self, level, reason):
+        self.log(f"Autotune: {reason}")
+        self.limiter.set_limit(level)
+        self._level_since = time.monotonic()
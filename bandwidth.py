@@ -0,0 +1,233 @@
+"""
+Bandwidth shaping for media and artwork transfers.
+
+A BandwidthLimiter holds the global cap. The cap is either fixed or follows a
+time-of-day schedule, e.g. "08:00-18:00=1M,18:00-08:00=0" for 1 MB/s during
+office hours and no limit at night. Every job takes a JobBandwidth from it,
+which adds an optional per-job cap. A transfer is charged against the job
+bucket and then against the global bucket, so all workers of all jobs share
+the global cap.
+
+yt-dlp is throttled in two ways. Its 'ratelimit' option caps each download at
+the current effective rate. A progress hook charges the bytes actually received
+to the buckets. The hook runs inside yt-dlp's read loop, so blocking there slows
+the transfer down.
+
+Rates are bytes per second and accept K/M/G suffixes ("500K", "2.5M"). An
+empty rate, or "0", means unlimited.
+
+ConnectionBudget caps the number of HTTP connections that all workers hold
+at once. Multi-connection downloads get only as many extra connections as
+the budget has free.
+
+Worker processes use the job's JobBandwidth and the ConnectionBudget through
+proxies to one copy held by a broker process (see executors.py), so the caps
+cover all processes together whatever the pool size.
+"""
+
+import contextlib
+import threading
+import time
+from datetime import datetime
+
+RATE_UNITS = {'': 1, 'B': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+SCHEDULE_REFRESH_SECONDS = 30
+
+
+def parse_rate(value):
+    """'2.5M' -> 2621440 bytes/s; empty, 0 or 'off' -> None (unlimited)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value or None
+    text = str(value).strip().upper().removesuffix('/S').removesuffix('B') or '0'
+    if text in ('0', 'OFF', 'NONE', 'UNLIMITED'):
+        return None
+    unit = text[-1] if text[-1] in RATE_UNITS else ''
+    try:
+        rate = float(text[:-1] if unit else text) * RATE_UNITS[unit]
+    except ValueError:
+        raise ValueError(f"Invalid bandwidth rate: {value!r}") from None
+    return rate or None
+
+
+def _parse_clock(text):
+    hours, minutes = text.strip().split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+class BandwidthSchedule:
+    """Time-of-day windows, each with its own rate; windows may wrap past midnight"""
+
+    def __init__(self, spec, default=None):
+        self.default = default
+        self.windows = []
+        for part in filter(None, (p.strip() for p in (spec or '').replace(';', ',').split(','))):
+            try:
+                span, rate = part.split('=')
+                start, end = span.split('-')
+                self.windows.append((_parse_clock(start), _parse_clock(end), parse_rate(rate)))
+            except ValueError:
+                raise ValueError(f"Invalid bandwidth schedule entry: {part!r} (expected HH:MM-HH:MM=RATE)") from None
+
+    def rate_at(self, when=None):
+        when = when or datetime.now()
+        minute = when.hour * 60 + when.minute
+        for start, end, rate in self.windows:
+            inside = start <= minute < end if start <= end else (minute >= start or minute < end)
+            if inside:
+                return rate
+        return self.default
+
+
+class TokenBucket:
+    """Thread-safe token bucket that lets callers go into debt and sleep it off"""
+
+    def __init__(self, rate, burst_seconds=1.0):
+        self.burst_seconds = burst_seconds
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._tokens = (rate or 0) * burst_seconds
+        self._updated = time.monotonic()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self._rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        if self._rate:
+            self._tokens = min(self._tokens + (now - self._updated) * self._rate, self._rate * self.burst_seconds)
+        self._updated = now
+
+    def consume(self, nbytes):
+        # Taking the tokens first and sleeping outside the lock queues concurrent
+        # callers behind each other's debt, which shares the rate between them
+        with self._lock:
+            if not self._rate:
+                return
+            self._refill()
+            self._tokens -= nbytes
+            wait = -self._tokens / self._rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class BandwidthLimiter:
+    def __init__(self, limit=None, schedule=None, scale=1.0):
+        self.limit_spec = limit
+        self.schedule_spec = schedule
+        self.scale = scale
+        self.schedule = BandwidthSchedule(schedule, default=parse_rate(limit))
+        self._bucket = TokenBucket(self.scaled(self.schedule.rate_at()))
+        self._checked = time.monotonic()
+
+    def scaled(self, rate):
+        return rate * self.scale if rate else None
+
+    def current_rate(self):
+        # Re-evaluated at most every SCHEDULE_REFRESH_SECONDS so transfers follow the schedule
+        now = time.monotonic()
+        if self.schedule.windows and now - self._checked >= SCHEDULE_REFRESH_SECONDS:
+            self._checked = now
+            rate = self.scaled(self.schedule.rate_at())
+            if rate != self._bucket.rate:
+                self._bucket.set_rate(rate)
+        return self._bucket.rate
+
+    def throttle(self, nbytes):
+        self.current_rate()
+        self._bucket.consume(nbytes)
+
+    def job(self, limit=None):
+        return JobBandwidth(self, limit)
+
+    def __reduce__(self):
+        # Pickled as settings only; the receiving process starts with its own bucket
+        return BandwidthLimiter, (self.limit_spec, self.schedule_spec, self.scale)
+
+
+class JobBandwidth:
+    """Per-job view of a BandwidthLimiter with its own optional cap"""
+
+    def __init__(self, limiter, limit=None):
+        self.limiter = limiter
+        self.limit_spec = limit
+        self._bucket = TokenBucket(limiter.scaled(parse_rate(limit)))
+
+    def effective_rate(self):
+        rates = [r for r in (self.limiter.current_rate(), self._bucket.rate) if r]
+        return min(rates) if rates else None
+
+    def throttle(self, nbytes):
+        if nbytes > 0:
+            self._bucket.consume(nbytes)
+            self.limiter.throttle(nbytes)
+
+    def __reduce__(self):
+        return JobBandwidth, (self.limiter, self.limit_spec)
+
+    def ydl_options(self):
+        """yt-dlp options that apply this job's limits to one download"""
+        seen = {}
+        lock = threading.Lock()
+
+        def progress_hook(d):
+            # Called with cumulative byte counts, possibly from several fragment threads
+            key = d.get('filename')
+            downloaded = d.get('downloaded_bytes') or 0
+            with lock:
+                if d.get('status') == 'finished' and key not in seen:
+                    # External downloaders report only the finished total; charging it
+                    # afterwards would just stall the worker, so it is not counted
+                    return
+                previous = seen.get(key, 0)
+                # A smaller count means the transfer restarted from scratch
+                delta = downloaded - previous if downloaded >= previous else downloaded
+                seen[key] = downloaded
+                if d.get('status') != 'downloading':
+                    seen.pop(key, None)
+            self.throttle(delta)
+
+        options = {'progress_hooks': [progress_hook]}
+        rate = self.effective_rate()
+        if rate:
+            options['ratelimit'] = int(rate)
+        return options
+
+    def iter_content(self, response, chunk_size=64 * 1024):
+        for chunk in response.iter_content(chunk_size):
+            self.throttle(len(chunk))
+            yield chunk
+
+
+class ConnectionBudget:
+    """Shared cap on open connections; every download is always granted at least one"""
+
+    def __init__(self, total):
+        self.total = total
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, wanted):
+        with self._lock:
+            granted = max(1, min(wanted, self.total - self._used))
+            self._used += granted
+        return granted
+
+    def release(self, granted):
+        with self._lock:
+            self._used -= granted
+
+    @contextlib.contextmanager
+    def reserve(self, wanted):
+        granted = self.acquire(wanted)
+        try:
+            yield granted
+        finally:
+            self.release(granted)
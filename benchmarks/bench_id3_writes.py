@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes written per tagged track.
+
+Compares the old delete/save/save tagging sequence against the single-pass
+writer in downloader.py, for a fresh ffmpeg-style file and for a re-tag.
+Run from the repository root: python benchmarks/bench_id3_writes.py
+"""
+
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mutagen.id3 import ID3, TSSE, delete as delete_id3
+
+from downloader import build_id3_tags, write_id3_tags
+from tracks import Track
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz frame: 417 bytes per frame
+FRAME_HEADER = b'\xff\xfb\x90\x64'
+FRAME_SIZE = 417
+FRAMES = 9000  # ~3.9 minutes of audio
+
+TRACK = Track(
+    name="Benchmark Track",
+    artist="Benchmark Artist",
+    album="Benchmark Album",
+)
+ARTWORK = os.urandom(120 * 1024)
+
+
+class CountingBytesIO(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_written = 0
+
+    def write(self, data):
+        self.bytes_written += len(data)
+        return super().write(data)
+
+
+def make_mp3():
+    """Build an in-memory MP3 that looks like fresh ffmpeg output (small ID3 + audio)"""
+    audio = (FRAME_HEADER + b'\x00' * (FRAME_SIZE - 4)) * FRAMES
+    f = CountingBytesIO(audio)
+    tags = ID3()
+    tags.add(TSSE(encoding=3, text="Lavf60.16.100"))
+    tags.save(f, padding=lambda info: 0)
+    return CountingBytesIO(f.getvalue())
+
+
+def legacy_tag(f):
+    """The previous tagging sequence: strip tags, save, then save the new tags"""
+    delete_id3(f)
+    f.seek(0)
+    tags = build_id3_tags(TRACK, ARTWORK)
+    tags.save(f, v2_version=3)
+
+
+def single_pass_tag(f):
+    write_id3_tags(f, TRACK, ARTWORK)
+
+
+def measure(tag_func):
+    f = make_mp3()
+    f.bytes_written = 0
+    tag_func(f)
+    first = f.bytes_written
+
+    f.seek(0)
+    f.bytes_written = 0
+    tag_func(f)
+    retag = f.bytes_written
+    return first, retag, len(f.getvalue())
+
+
+def main():
+    print(f"{'writer':<14}{'first tag':>14}{'re-tag':>14}{'file size':>14}")
+    for label, func in (("legacy", legacy_tag), ("single-pass", single_pass_tag)):
+        first, retag, size = measure(func)
+        print(f"{label:<14}{first:>14,}{retag:>14,}{size:>14,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory held by the track list at 10k and 100k tracks.
+
+Compares plain dict tracks loaded with csv.DictReader (the previous
+representation) with Track records loaded by load_playlist_from_csv.
+Run from the repository root: python benchmarks/bench_track_memory.py
+"""
+
+import csv
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloader import load_playlist_from_csv, write_playlist_csv
+from tracks import Track
+
+TRACKS_PER_ALBUM = 12
+
+
+def make_tracks(count):
+    tracks = []
+    for i in range(count):
+        album = i // TRACKS_PER_ALBUM
+        artist = f"Artist {album % 997}"
+        tracks.append(Track(
+            name=f"Track number {i}",
+            artist=artist,
+            album=f"Album title {album}",
+            thumbnail_url=f"https://i.scdn.co/image/ab67616d0000b273{album:024x}",
+            search_query=f"Track number {i} {artist}",
+            id=f"{i:022d}",
+            isrc=f"USRC1{i:07d}",
+            duration_ms=180000 + i % 60000,
+            track_number=i % TRACKS_PER_ALBUM + 1,
+            disc_number=1,
+            artists=f"{artist}; Featured {i % 31}",
+            release_date=f"20{album % 25:02d}-01-01",
+        ))
+    return tracks
+
+
+def load_as_dicts(csv_path):
+    tracks = []
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            row['downloaded'] = row['downloaded'].lower() == 'true'
+            tracks.append(row)
+    return tracks
+
+
+def measure(loader, csv_path):
+    gc.collect()
+    tracemalloc.start()
+    tracks = loader(csv_path)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tracks
+    return current, peak
+
+
+def main():
+    print(f"{'tracks':>8}  {'representation':<16}{'retained MB':>12}{'peak MB':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in (10_000, 100_000):
+            csv_path = os.path.join(tmp, f"playlist-{count}.csv")
+            write_playlist_csv(csv_path, make_tracks(count))
+            for label, loader in (("dict", load_as_dicts), ("Track", load_playlist_from_csv)):
+                current, peak = measure(loader, csv_path)
+                print(f"{count:>8}  {label:<16}{current / 1e6:>12.1f}{peak / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
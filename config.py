@@ -1,4 +1,6 @@
 import os
+import tempfile
+from pathlib import Path
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,4 +9,64 @@ SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
 DEFAULT_DOWNLOAD_DIR = os.getenv("DEFAULT_DOWNLOAD_DIR", "downloads")
 
+# Shared by every process of a deployment; point at shared storage to share caches across hosts
+CACHE_DIR = os.getenv("CACHE_DIR", str(Path.home() / ".cache" / "spotify-playlist-downloader"))
+SPOTIFY_CACHE_ENABLED = os.getenv("SPOTIFY_CACHE_ENABLED", "true").lower() == "true"
+SPOTIFY_TOKEN_CACHE = os.getenv("SPOTIFY_TOKEN_CACHE", os.path.join(CACHE_DIR, "spotify_token.json"))
+SPOTIFY_RESPONSE_CACHE = os.getenv("SPOTIFY_RESPONSE_CACHE", os.path.join(CACHE_DIR, "spotify_responses.sqlite"))
+SPOTIFY_MAX_REQUESTS_PER_SECOND = float(os.getenv("SPOTIFY_MAX_REQUESTS_PER_SECOND", "5"))
+
+# Scratch area for in-progress downloads; local SSD or tmpfs is best when the library is on a network share
+STAGING_DIR = os.getenv("STAGING_DIR", os.path.join(tempfile.gettempdir(), "spotify-playlist-downloader"))
+
+# Per-track execution: "threads", "processes" or "hybrid" (processes extract, threads download)
+EXECUTOR_BACKEND = os.getenv("EXECUTOR_BACKEND", "threads")
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "5"))
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "200"))
+BATCH_DELAY_MINUTES = float(os.getenv("BATCH_DELAY_MINUTES", "5"))
+
+# When enabled, MAX_WORKERS is only the starting point and the worker count is tuned within these bounds
+AUTOTUNE = os.getenv("AUTOTUNE", "true").lower() == "true"
+AUTOTUNE_MIN_WORKERS = int(os.getenv("AUTOTUNE_MIN_WORKERS", "2"))
+AUTOTUNE_MAX_WORKERS = int(os.getenv("AUTOTUNE_MAX_WORKERS", "16"))
+
+# Bandwidth caps in bytes/s with K/M/G suffixes ("2M"); empty or 0 means unlimited.
+# BANDWIDTH_SCHEDULE overrides BANDWIDTH_LIMIT by time of day, e.g. "08:00-18:00=1M,18:00-08:00=0"
+BANDWIDTH_LIMIT = os.getenv("BANDWIDTH_LIMIT", "")
+BANDWIDTH_SCHEDULE = os.getenv("BANDWIDTH_SCHEDULE", "")
+JOB_BANDWIDTH_LIMIT = os.getenv("JOB_BANDWIDTH_LIMIT", "")
+
+# Extra outputs made from the same download as the main file, as "format:bitrate:dir"
+# entries, e.g. "mp3:128:/sync/mobile". File names do not include the bitrate, so an
+# extra MP3 needs its own dir; an empty dir would overwrite the main file and is rejected
+EXTRA_RENDITIONS = os.getenv("EXTRA_RENDITIONS", "")
+
+# Tracks that failed permanently (removed, region-blocked, no results) are skipped for this long
+NEGATIVE_CACHE_TTL_HOURS = float(os.getenv("NEGATIVE_CACHE_TTL_HOURS", str(7 * 24)))
+
+# Threads used to check MP3 frame headers when verifying a library (the checks only read a few KB per file)
+VERIFY_WORKERS = int(os.getenv("VERIFY_WORKERS", "16"))
+
+# Source selection never falls back to formats with video unless this is enabled
+ALLOW_VIDEO_FALLBACK = os.getenv("ALLOW_VIDEO_FALLBACK", "false").lower() == "true"
+
+# Tracks at least SEGMENTED_MIN_DURATION_SECONDS long are fetched over several connections
+# (aria2c ranges for plain HTTP when installed, concurrent fragments for DASH/HLS).
+# MAX_TOTAL_CONNECTIONS caps the connections of all workers together.
+SEGMENT_CONNECTIONS = int(os.getenv("SEGMENT_CONNECTIONS", "4"))
+SEGMENTED_MIN_DURATION_SECONDS = int(os.getenv("SEGMENTED_MIN_DURATION_SECONDS", "600"))
+MAX_TOTAL_CONNECTIONS = int(os.getenv("MAX_TOTAL_CONNECTIONS", "32"))
+
+# Opt-in profiling: "sample" (collapsed stacks), "trace" (trace-event timeline) or "sample,trace"
+PROFILE = os.getenv("PROFILE", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(CACHE_DIR, "profiles"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "10"))
+
+# Local download service shared by the GUI and scripts
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8765"))
+# Written by the service on start (readable by the current user only); clients send it with every request
+SERVICE_TOKEN_FILE = os.getenv("SERVICE_TOKEN_FILE", os.path.join(CACHE_DIR, "service.token"))
+
 os.makedirs(DEFAULT_DOWNLOAD_DIR, exist_ok=True)
+os.makedirs(CACHE_DIR, exist_ok=True)
@@ -1,65 +1,133 @@
 from pathlib import Path
 import base64
+import hashlib
+import os
 import re
+import struct
+import threading
 import shutil
 import time
 import requests
 import csv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 from PyQt5.QtCore import pyqtSignal, QObject
-from mutagen.mp3 import MP3
-from mutagen.id3 import ID3, APIC, TPE1, TIT2, TALB
+from mutagen.id3 import ID3, ID3NoHeaderError, APIC, TPE1, TIT2, TALB, TRCK, TPOS, TDRC, TSRC, TXXX
 
 import yt_dlp
 import backoff
 import spotipy
+from spotipy.cache_handler import CacheFileHandler
 from spotipy.oauth2 import SpotifyClientCredentials
 
-from config import SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET
+from config import (
+    SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, SPOTIFY_CACHE_ENABLED, SPOTIFY_TOKEN_CACHE,
+    SPOTIFY_RESPONSE_CACHE, SPOTIFY_MAX_REQUESTS_PER_SECOND, STAGING_DIR, EXECUTOR_BACKEND, MAX_WORKERS,
+    BATCH_SIZE, BATCH_DELAY_MINUTES, AUTOTUNE, AUTOTUNE_MIN_WORKERS, AUTOTUNE_MAX_WORKERS,
+    BANDWIDTH_LIMIT, BANDWIDTH_SCHEDULE, JOB_BANDWIDTH_LIMIT, SEGMENT_CONNECTIONS, SEGMENTED_MIN_DURATION_SECONDS,
+    MAX_TOTAL_CONNECTIONS, ALLOW_VIDEO_FALLBACK, EXTRA_RENDITIONS, NEGATIVE_CACHE_TTL_HOURS, VERIFY_WORKERS
+)
+from spotify_cache import CachedSession
+from autotune import ConcurrencyLimiter, ThroughputAutotuner
+from bandwidth import BandwidthLimiter, ConnectionBudget
+from failures import FATAL, PERMANENT, DeadLetters, FatalError, PermanentError, classify, is_transient
+from profiling import profile_run, span
+from renditions import Rendition, check_renditions, encode_renditions, parse_renditions
+from tracks import CSV_FIELDS, Track
+from staging import ScratchSpace, estimate_scratch_bytes, publish_file
+from verify import file_bitrate, scan_files, verify_mp3
 
 
 # ========== Utility ==========
+# How often batched status changes are written back to playlist.csv
+STATUS_FLUSH_SECONDS = 5
+
+
 def sanitize_filename(name):
     return re.sub(r'[\\/*?:"<>|]', "_", name)
 
 
 def save_playlist_to_csv(tracks, output_dir):
     csv_path = Path(output_dir) / "playlist.csv"
-    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['name', 'artist', 'album', 'thumbnail_url', 'search_query', 'downloaded'])
-        writer.writeheader()
-        for track in tracks:
-            track['downloaded'] = False
-            writer.writerow(track)
+    for track in tracks:
+        track.downloaded = False
+    write_playlist_csv(csv_path, tracks)
+    _register_playlist(csv_path, tracks)
     return csv_path
 
 
 def load_playlist_from_csv(csv_path):
-    tracks = []
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            row['downloaded'] = row['downloaded'].lower() == 'true'
-            tracks.append(row)
-    return tracks
+    with open(csv_path, 'r', newline='', encoding='utf-8') as f:
+        # Older files may lack newer columns; from_row loads them as None
+        return [Track.from_row(row) for row in csv.DictReader(f)]
+
+
+# playlist.csv files this process is updating, so status changes are applied
+# to the Track objects in memory instead of re-reading the file every time
+_playlists = {}
+_playlists_lock = threading.Lock()
+
+
+class _PlaylistState:
+    __slots__ = ('tracks', 'by_name', 'dirty', 'flushed_at')
+
+    def __init__(self, tracks):
+        self.tracks = tracks
+        self.by_name = {}
+        for track in tracks:
+            self.by_name.setdefault(track.name, []).append(track)
+        self.dirty = False
+        self.flushed_at = time.monotonic()
+
+
+def _register_playlist(csv_path, tracks):
+    with _playlists_lock:
+        _playlists[str(Path(csv_path).resolve())] = _PlaylistState(tracks)
 
 
 def update_track_status(csv_path, track_name, downloaded=True):
-    tracks = load_playlist_from_csv(csv_path)
-    for track in tracks:
-        if track['name'] == track_name:
-            track['downloaded'] = downloaded
-    
+    key = str(Path(csv_path).resolve())
+    with _playlists_lock:
+        state = _playlists.get(key)
+    if state is None:
+        _register_playlist(csv_path, load_playlist_from_csv(csv_path))
+        with _playlists_lock:
+            state = _playlists[key]
+
+    with _playlists_lock:
+        for track in state.by_name.get(track_name, ()):
+            track.downloaded = downloaded
+        state.dirty = True
+        if time.monotonic() - state.flushed_at < STATUS_FLUSH_SECONDS:
+            return
+        _write_rows(csv_path, state.tracks)
+        state.dirty = False
+        state.flushed_at = time.monotonic()
+
+
+def flush_track_status(csv_path):
+    # Writes pending status changes and stops tracking the file
+    with _playlists_lock:
+        state = _playlists.pop(str(Path(csv_path).resolve()), None)
+        if state is not None and state.dirty:
+            _write_rows(csv_path, state.tracks)
+
+
+def write_playlist_csv(csv_path, tracks):
+    with _playlists_lock:
+        _write_rows(csv_path, tracks)
+
+
+def _write_rows(csv_path, tracks):
     with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['name', 'artist', 'album', 'thumbnail_url', 'search_query', 'downloaded'])
-        writer.writeheader()
-        writer.writerows(tracks)
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        writer.writerows([getattr(track, field) for field in CSV_FIELDS] for track in tracks)
 
 
 def check_ffmpeg():
     if not shutil.which("ffmpeg"):
-        raise EnvironmentError("ffmpeg not found. Please install ffmpeg and ensure it's in your system PATH.")
+        raise FatalError("ffmpeg not found. Please install ffmpeg and ensure it's in your system PATH.")
 
 
 # ========== GUI Signals ==========
@@ -67,6 +135,9 @@ class SignalHandler(QObject):
     log_signal = pyqtSignal(str)
     done_signal = pyqtSignal()
     batch_complete_signal = pyqtSignal()
+    # The job's track list ([name, artist, album] rows), then (row, status, detail) per change
+    tracks_signal = pyqtSignal(list)
+    track_status_signal = pyqtSignal(int, str, str)
 
 
 signals = SignalHandler()
@@ -74,162 +145,531 @@ signals = SignalHandler()
 # ========== Spotify Setup ==========
 sp = None
 if SPOTIFY_CLIENT_ID and SPOTIFY_CLIENT_SECRET:
-    sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
-        client_id=SPOTIFY_CLIENT_ID,
-        client_secret=SPOTIFY_CLIENT_SECRET
-    ))
+    # Token is cached on disk so concurrent and repeated processes reuse it
+    sp = spotipy.Spotify(
+        auth_manager=SpotifyClientCredentials(
+            client_id=SPOTIFY_CLIENT_ID,
+            client_secret=SPOTIFY_CLIENT_SECRET,
+            cache_handler=CacheFileHandler(cache_path=SPOTIFY_TOKEN_CACHE)
+        ),
+        requests_session=CachedSession(
+            SPOTIFY_RESPONSE_CACHE,
+            max_requests_per_second=SPOTIFY_MAX_REQUESTS_PER_SECOND
+        ) if SPOTIFY_CACHE_ENABLED else True
+    )
 
-# ========== Download Logic ==========
-@backoff.on_exception(backoff.expo, Exception, max_tries=3)
-def download_from_youtube(track_info, quality, output_dir, csv_path=None):
-    check_ffmpeg()
+# ========== Tagging ==========
+# One pooled session for artwork fetches, kept warm for the life of the process
+http = requests.Session()
+# Global cap shared by all media and artwork transfers of this process
+bandwidth = BandwidthLimiter(BANDWIDTH_LIMIT, BANDWIDTH_SCHEDULE)
 
-    output_dir = Path(output_dir).expanduser().resolve()
-    sanitized_name = sanitize_filename(track_info['search_query'])
 
-    # Skip if already downloaded
-    final_name = f"{sanitized_name}.mp3"
-    if (output_dir / final_name).exists():
-        signals.log_signal.emit(f"Skipping already downloaded: {track_info['name']}")
-        if csv_path:
-            update_track_status(csv_path, track_info['name'])
-        return True
+def job_bandwidth(limit=None):
+    # None means the configured per-job default; "0" lifts the per-job cap
+    return bandwidth.job(JOB_BANDWIDTH_LIMIT if limit is None else limit)
 
-    ydl_opts = {
-        'format': 'bestaudio[ext=m4a]/bestaudio/best',
-        'outtmpl': str(output_dir / f"{sanitized_name}.%(ext)s"),
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': str(quality),
-        }],
-        'quiet': True,
-        'noplaylist': True,
-        'retries': 3,
-        'ignoreerrors': True,
-        'socket_timeout': 10,
-        'no_warnings': True,
-    }
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        signals.log_signal.emit(f"Downloading: {track_info['search_query']}")
-        search = ydl.extract_info(f"ytsearch:{track_info['search_query']}", download=False)
-        if not search or not search.get('entries'):
-            raise Exception("No YouTube search results found")
-        result = search['entries'][0]
-        video_url = f"https://www.youtube.com/watch?v={result['id']}"
-        info = ydl.extract_info(video_url, download=True)
-
-        final_name = f"{sanitize_filename(track_info['search_query'])}.mp3"
-        mp3_file = output_dir / final_name
-
-        # If file doesn't exist, try to find and rename the one yt_dlp created
-        if not mp3_file.exists():
-            for f in output_dir.glob("*.mp3"):
-                if sanitize_filename(info['title']) in f.stem:
-                    f.rename(mp3_file)
-                    break
-            else:
-                raise FileNotFoundError(f"Expected MP3 not found or renamed: {mp3_file}")
 
+def fetch_artwork(url, shaper=None):
+    shaper = shaper or job_bandwidth()
+    with http.get(url, timeout=10, stream=True) as response:
+        response.raise_for_status()
+        data = b''.join(shaper.iter_content(response))
+        return data, response.headers.get('Content-Type')
+
+# Extra ID3 padding reserved on top of the artwork size, so a later re-tag with
+# a similar cover and frames can be rewritten in place instead of moving the audio.
+ID3_MIN_PADDING = 16 * 1024
 
+
+def load_artwork(track_info, info=None, shaper=None):
+    # Determine the correct thumbnail source (supports http(s) and local file paths)
+    thumbnail_data = None
+    thumbnail_mime = 'image/jpeg'
+    if track_info.thumbnail_data:
+        thumbnail_data = track_info.thumbnail_data
+    elif track_info.thumbnail_url:
+        thumb = track_info.thumbnail_url
         try:
-            audio = MP3(mp3_file, ID3=ID3)
-            if audio.tags is None:
-                audio.add_tags()
+            if isinstance(thumb, str) and (thumb.startswith('http://') or thumb.startswith('https://')):
+                thumbnail_data, content_type = fetch_artwork(thumb, shaper)
+                # best guess for remote images
+                if content_type:
+                    thumbnail_mime = content_type
             else:
-                audio.delete()
-                audio.save()
-
-            audio.tags.add(TIT2(encoding=3, text=track_info['name']))
-            audio.tags.add(TPE1(encoding=3, text=track_info['artist']))
-            audio.tags.add(TALB(encoding=3, text=track_info['album']))
+                thumb_path = Path(thumb)
+                if thumb_path.exists() and thumb_path.is_file():
+                    with open(thumb_path, 'rb') as f:
+                        thumbnail_data = f.read()
+                    # Set mime from extension if possible
+                    ext = thumb_path.suffix.lower()
+                    if ext == '.png':
+                        thumbnail_mime = 'image/png'
+                    elif ext in ('.jpg', '.jpeg'):
+                        thumbnail_mime = 'image/jpeg'
+                else:
+                    signals.log_signal.emit(f"Artwork path not found or invalid: {thumb}")
+        except Exception as e:
+            signals.log_signal.emit(f"Failed to load artwork: {e}")
 
-            # Determine the correct thumbnail source (supports http(s) and local file paths)
-            thumbnail_data = None
-            thumbnail_mime = 'image/jpeg'
-            if 'thumbnail_data' in track_info and track_info['thumbnail_data']:
-                thumbnail_data = track_info['thumbnail_data']
-            elif 'thumbnail_url' in track_info and track_info['thumbnail_url']:
-                thumb = track_info['thumbnail_url']
+    # Try falling back to YouTube thumbnail if none provided/loaded
+    if not thumbnail_data and isinstance(info, dict):
+        yt_thumb = info.get('thumbnail')
+        if not yt_thumb:
+            thumbs = info.get('thumbnails') or []
+            if isinstance(thumbs, list) and thumbs:
                 try:
-                    if isinstance(thumb, str) and (thumb.startswith('http://') or thumb.startswith('https://')):
-                        response = requests.get(thumb, timeout=10)
-                        response.raise_for_status()
-                        thumbnail_data = response.content
-                        # best guess for remote images
-                        if response.headers.get('Content-Type'):
-                            thumbnail_mime = response.headers.get('Content-Type')
-                    else:
-                        thumb_path = Path(thumb)
-                        if thumb_path.exists() and thumb_path.is_file():
-                            with open(thumb_path, 'rb') as f:
-                                thumbnail_data = f.read()
-                            # Set mime from extension if possible
-                            ext = thumb_path.suffix.lower()
-                            if ext == '.png':
-                                thumbnail_mime = 'image/png'
-                            elif ext in ('.jpg', '.jpeg'):
-                                thumbnail_mime = 'image/jpeg'
-                        else:
-                            signals.log_signal.emit(f"Artwork path not found or invalid: {thumb}")
-                except Exception as e:
-                    signals.log_signal.emit(f"Failed to load artwork: {e}")
-
-            # Try falling back to YouTube thumbnail if none provided/loaded
-            if not thumbnail_data and isinstance(info, dict):
-                yt_thumb = info.get('thumbnail')
-                if not yt_thumb:
-                    thumbs = info.get('thumbnails') or []
-                    if isinstance(thumbs, list) and thumbs:
-                        try:
-                            yt_thumb = sorted(
-                                thumbs,
-                                key=lambda t: ((t.get('height') or 0) * (t.get('width') or 0))
-                            )[-1].get('url')
-                        except Exception:
-                            yt_thumb = thumbs[-1].get('url') if isinstance(thumbs[-1], dict) else None
-                if yt_thumb:
-                    try:
-                        response = requests.get(yt_thumb, timeout=10)
-                        response.raise_for_status()
-                        thumbnail_data = response.content
-                        if response.headers.get('Content-Type'):
-                            thumbnail_mime = response.headers.get('Content-Type')
-                    except Exception as e:
-                        signals.log_signal.emit(f"Failed to fetch YouTube artwork: {e}")
-
-            # Fallback to a tiny 1x1 PNG to avoid missing artwork when desired file isn't available
-            if not thumbnail_data:
-                try:
-                    tiny_png_base64 = (
-                        'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8/x8AAucB9Ue0mD0AAAAASUVORK5CYII='
-                    )
-                    thumbnail_data = base64.b64decode(tiny_png_base64)
-                    thumbnail_mime = 'image/png'
+                    yt_thumb = sorted(
+                        thumbs,
+                        key=lambda t: ((t.get('height') or 0) * (t.get('width') or 0))
+                    )[-1].get('url')
                 except Exception:
-                    thumbnail_data = None
-
-            if thumbnail_data:
-                audio.tags.add(APIC(
-                    encoding=3,
-                    mime=thumbnail_mime,
-                    type=3,
-                    desc='Cover',
-                    data=thumbnail_data
-                ))
-                signals.log_signal.emit(f"Added artwork to: {track_info['name']}")
+                    yt_thumb = thumbs[-1].get('url') if isinstance(thumbs[-1], dict) else None
+        if yt_thumb:
+            try:
+                thumbnail_data, content_type = fetch_artwork(yt_thumb, shaper)
+                if content_type:
+                    thumbnail_mime = content_type
+            except Exception as e:
+                signals.log_signal.emit(f"Failed to fetch YouTube artwork: {e}")
+
+    # Fallback to a tiny 1x1 PNG to avoid missing artwork when desired file isn't available
+    if not thumbnail_data:
+        try:
+            tiny_png_base64 = (
+                'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mP8/x8AAucB9Ue0mD0AAAAASUVORK5CYII='
+            )
+            thumbnail_data = base64.b64decode(tiny_png_base64)
+            thumbnail_mime = 'image/png'
+        except Exception:
+            thumbnail_data = None
+
+    return thumbnail_data, thumbnail_mime
+
+
+def id3_padding_for(thumbnail_data):
+    reserve = ID3_MIN_PADDING + len(thumbnail_data or b'') // 2
+
+    def padding(info):
+        # Reuse whatever space the existing tag has so the write stays in place;
+        # only grow (and reserve headroom for next time) when the frames no longer fit.
+        if info.padding >= 0:
+            return info.padding
+        return reserve
+
+    return padding
+
+
+# Fields that end up in the tag; their hash is stored in the file so a retag
+# pass can tell whether a file is current without loading its artwork.
+TAG_SIGNATURE_FIELDS = (
+    'name', 'artist', 'album', 'thumbnail_url',
+    'artists', 'track_number', 'disc_number', 'release_date', 'isrc'
+)
+TAG_SIGNATURE_DESC = 'spd_tag_signature'
+TAG_ARTWORK_DESC = 'spd_artwork_source'
+# Length the file was verified against when it was downloaded; verify_library checks the same
+TAG_EXPECTED_SECONDS_DESC = 'spd_expected_seconds'
+
+
+def tag_signature(track_info):
+    values = '\x1f'.join(str(getattr(track_info, field) or '') for field in TAG_SIGNATURE_FIELDS)
+    return hashlib.sha1(values.encode('utf-8')).hexdigest()
+
+
+def build_id3_tags(track_info, thumbnail_data=None, thumbnail_mime='image/jpeg', expected_seconds=None):
+    tags = ID3()
+    tags.add(TIT2(encoding=3, text=track_info.name))
+    artists = track_info.artists
+    tags.add(TPE1(encoding=3, text=artists.split(ARTIST_SEPARATOR) if artists else track_info.artist))
+    tags.add(TALB(encoding=3, text=track_info.album))
+    if track_info.track_number:
+        tags.add(TRCK(encoding=3, text=str(track_info.track_number)))
+    if track_info.disc_number:
+        tags.add(TPOS(encoding=3, text=str(track_info.disc_number)))
+    if track_info.release_date:
+        tags.add(TDRC(encoding=3, text=str(track_info.release_date)))
+    if track_info.isrc:
+        tags.add(TSRC(encoding=3, text=track_info.isrc))
+    # Latin-1 so read_tag_markers can decode them without a full ID3 parse
+    tags.add(TXXX(encoding=0, desc=TAG_SIGNATURE_DESC, text=tag_signature(track_info)))
+    if track_info.thumbnail_url and str(track_info.thumbnail_url).isascii():
+        tags.add(TXXX(encoding=0, desc=TAG_ARTWORK_DESC, text=str(track_info.thumbnail_url)))
+    if expected_seconds:
+        tags.add(TXXX(encoding=0, desc=TAG_EXPECTED_SECONDS_DESC, text=f"{float(expected_seconds):.1f}"))
+    if thumbnail_data:
+        tags.add(APIC(
+            encoding=3,
+            mime=thumbnail_mime,
+            type=3,
+            desc='Cover',
+            data=thumbnail_data
+        ))
+    return tags
+
+
+def write_id3_tags(mp3_file, track_info, thumbnail_data=None, thumbnail_mime='image/jpeg', expected_seconds=None):
+    # Replaces any existing ID3v2 tag in a single save. mutagen only moves the
+    # audio data when the new tag is larger than the space already reserved.
+    tags = build_id3_tags(track_info, thumbnail_data, thumbnail_mime, expected_seconds)
+    tags.save(mp3_file, v1=1, v2_version=3, padding=id3_padding_for(thumbnail_data))
+
+
+def read_tag_markers(mp3_file):
+    # Reads only the text frames at the front of the ID3v2 tag (mutagen writes
+    # APIC last), returning our Latin-1 TXXX markers without touching the artwork.
+    markers = {}
+    with open(mp3_file, 'rb') as f:
+        header = f.read(10)
+        if len(header) < 10 or header[:3] != b'ID3' or header[3] not in (3, 4):
+            return markers
+        version = header[3]
+        tag_size = _synchsafe(header[6:10])
+        pos = 0
+        while pos + 10 <= tag_size:
+            frame_header = f.read(10)
+            if len(frame_header) < 10 or frame_header[0] == 0:
+                break
+            frame_id = frame_header[:4]
+            if version == 4:
+                frame_size = _synchsafe(frame_header[4:8])
             else:
-                signals.log_signal.emit(f"No artwork found for: {track_info['name']}")
+                frame_size = struct.unpack('>I', frame_header[4:8])[0]
+            pos += 10 + frame_size
+            if frame_id == b'APIC' or pos > tag_size:
+                break
+            if frame_id != b'TXXX':
+                f.seek(frame_size, os.SEEK_CUR)
+                continue
+            payload = f.read(frame_size)
+            if payload[:1] != b'\x00':
+                continue
+            desc, _, value = payload[1:].partition(b'\x00')
+            markers[desc.decode('latin-1')] = value.rstrip(b'\x00').decode('latin-1')
+    return markers
 
-            audio.save(v2_version=3)
 
-        except Exception as e:
-            signals.log_signal.emit(f"Metadata error for {track_info['name']}: {e}")
+def _synchsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+# ========== Download Logic ==========
+# All intermediate files live here; only finished, tagged MP3s reach output_dir
+scratch = ScratchSpace(STAGING_DIR)
+
+SEARCH_CANDIDATES = 3
+SEARCH_DURATION_TOLERANCE = 10  # seconds
+
+
+def pick_search_result(entries, duration_ms=None):
+    # Prefer the best ranked result whose length matches the Spotify duration
+    if duration_ms:
+        expected = int(duration_ms) / 1000
+        for entry in entries:
+            if entry.get('duration') and abs(entry['duration'] - expected) <= SEARCH_DURATION_TOLERANCE:
+                return entry
+    return entries[0]
+
+
+SEARCH_OPTS = {
+    'quiet': True,
+    'noplaylist': True,
+    # Errors must propagate so their message can be classified as transient or permanent
+    'ignoreerrors': False,
+    'socket_timeout': 10,
+    'no_warnings': True,
+}
+# Parts of the info dict the download stage never uses; dropped so resolved
+# results stay small when they are sent back from a worker process
+UNUSED_INFO_KEYS = ('automatic_captions', 'subtitles', 'heatmap', 'description', 'tags', 'categories')
+
+
+def compact_info(info):
+    info = {k: v for k, v in info.items() if k not in UNUSED_INFO_KEYS}
+    info['formats'] = [f for f in info.get('formats') or [] if f.get('acodec') != 'none']
+    thumbs = info.get('thumbnails') or []
+    if thumbs:
+        info['thumbnails'] = [max(thumbs, key=lambda t: (t.get('height') or 0) * (t.get('width') or 0))]
+    return info
+
+
+def resolve_track(track_info):
+    # Search and extraction only (CPU heavy, no media transfer); the result is
+    # a plain JSON-safe dict that download_from_youtube can download from later.
+    with yt_dlp.YoutubeDL(SEARCH_OPTS) as ydl:
+        signals.log_signal.emit(f"Downloading: {track_info.search_query}")
+        # Unprocessed search results already carry id and duration, so only the chosen video is extracted
+        candidates = SEARCH_CANDIDATES if track_info.duration_ms else 1
+        search = ydl.extract_info(f"ytsearch{candidates}:{track_info.search_query}", download=False, process=False)
+        entries = [e for e in (search or {}).get('entries') or [] if e and e.get('id')]
+        if not entries:
+            raise PermanentError("No YouTube search results found")
+        result = pick_search_result(entries, track_info.duration_ms)
+        info = ydl.extract_info(f"https://www.youtube.com/watch?v={result['id']}", download=False)
+        if not info:
+            raise Exception(f"Failed to extract video info for {result['id']}")
+        return compact_info(ydl.sanitize_info(info, remove_private_keys=True))
+
+
+@backoff.on_exception(backoff.expo, Exception, max_tries=3, giveup=lambda e: not is_transient(e))
+def resolve_track_with_retry(track_info):
+    # For callers that resolve outside download_from_youtube, which retries its own resolve
+    return resolve_track(track_info)
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers with the same key share its outcome"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), False
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, True
+        finally:
+            with self._lock:
+                del self._calls[key]
+
 
+_downloads_in_flight = SingleFlight()
+
+# Nominal bitrates are approximate (YouTube's "128k" AAC reports ~129, Opus varies),
+# so a source within this fraction of the target counts as meeting it
+FORMAT_BITRATE_SLACK = 0.9
+
+
+def _format_kbps(fmt):
+    return fmt.get('abr') or fmt.get('tbr') or 0
+
+
+def audio_format_selector(quality, allow_video=ALLOW_VIDEO_FALLBACK):
+    """yt-dlp format selector: the smallest audio-only source that still meets the target bitrate"""
+    target = int(quality) * FORMAT_BITRATE_SLACK
+
+    def select(ctx):
+        # Every format covers the same duration, so bitrate orders them by transfer size
+        formats = [f for f in ctx.get('formats') or [] if f.get('acodec') != 'none' and f.get('url')]
+        audio_only = [f for f in formats if f.get('vcodec') == 'none']
+        if audio_only:
+            sufficient = [f for f in audio_only if _format_kbps(f) >= target]
+            if sufficient:
+                yield min(sufficient, key=lambda f: (_format_kbps(f), f.get('filesize') or 0))
+            else:
+                # Nothing reaches the target; the best audio-only source loses the least
+                yield max(audio_only, key=_format_kbps)
+        elif allow_video and formats:
+            yield min(formats, key=lambda f: _format_kbps(f) or float('inf'))
+
+    return select
+
+
+def _transfer_counter(totals):
+    def hook(d):
+        if d.get('status') == 'finished':
+            totals.append(d.get('total_bytes') or d.get('downloaded_bytes') or 0)
+    return hook
+
+
+connections = ConnectionBudget(MAX_TOTAL_CONNECTIONS)
+ARIA2C = shutil.which('aria2c')
+
+
+def segmented_options(connection_count, rate_limited=False):
+    # DASH/HLS fragments are fetched in parallel by yt-dlp itself; single-file HTTP
+    # streams are split into ranges by aria2c. aria2c reports no progress while it
+    # runs, so the shared token buckets cannot pace it; it is only used uncapped.
+    options = {'concurrent_fragment_downloads': connection_count}
+    if connection_count > 1 and ARIA2C and not rate_limited:
+        options['external_downloader'] = {'http': 'aria2c'}
+        options['external_downloader_args'] = {'aria2c': [
+            f'--max-connection-per-server={connection_count}', f'--split={connection_count}',
+            '--min-split-size=1M', '--max-concurrent-downloads=1',
+        ]}
+    return options
+
+
+def download_key(track_info, output_dir):
+    # Tracks that share a search query end up in the same file, so they share one download
+    return str(Path(output_dir).expanduser().resolve() / f"{sanitize_filename(track_info.search_query)}.mp3")
+
+
+def job_renditions(quality, extra=None, output_dir=None):
+    # The job's own quality into its download folder, plus EXTRA_RENDITIONS (or the given extras)
+    extra = parse_renditions(EXTRA_RENDITIONS) if extra is None else list(extra)
+    renditions = [Rendition('mp3', quality)] + extra
+    check_renditions(renditions, output_dir)
+    return renditions
+
+
+def rendition_targets(track_info, quality, output_dir, renditions=None):
+    """(rendition, final path) for every rendition of a track"""
+    renditions = renditions or [Rendition('mp3', quality)]
+    output_dir = Path(output_dir).expanduser().resolve()
+    sanitized_name = sanitize_filename(track_info.search_query)
+    try:
+        check_renditions(renditions, output_dir)
+    except ValueError as e:
+        # Every track of the job would fail the same way, so this must not be retried per track
+        raise FatalError(str(e)) from e
+    return [
+        (rendition, Path(rendition.target_dir or output_dir).expanduser().resolve() / (sanitized_name + rendition.extension))
+        for rendition in renditions
+    ]
+
+
+def pending_renditions(track_info, quality, output_dir, renditions=None):
+    return [(rendition, path) for rendition, path in rendition_targets(track_info, quality, output_dir, renditions)
+            if not path.exists()]
+
+
+def download_from_youtube(track_info, quality, output_dir, csv_path=None, resolved=None, shaper=None,
+                          renditions=None):
+    with span('track', cat='track', track=track_info.name):
+        result, leader = _downloads_in_flight.do(
+            download_key(track_info, output_dir),
+            _download_from_youtube, track_info, quality, output_dir, csv_path, resolved, shaper, renditions
+        )
+    if not leader:
+        signals.log_signal.emit(f"Reused in-flight download for: {track_info.name}")
+        if csv_path:
+            update_track_status(csv_path, track_info.name)
+    return result
+
+
+def _downloaded_file(info, job_dir):
+    for download in (info or {}).get('requested_downloads') or []:
+        if download.get('filepath') and Path(download['filepath']).exists():
+            return Path(download['filepath'])
+    for f in job_dir.glob("source.*"):
+        if f.suffix not in ('.part', '.ytdl'):
+            return f
+    raise FileNotFoundError(f"Downloaded source not found in {job_dir}")
+
+
+@backoff.on_exception(backoff.expo, Exception, max_tries=3, giveup=lambda e: not is_transient(e))
+def _download_from_youtube(track_info, quality, output_dir, csv_path=None, resolved=None, shaper=None,
+                           renditions=None):
+    check_ffmpeg()
+    shaper = shaper or job_bandwidth()
+
+    # Skip renditions that are already downloaded; the rest share one fetch and one decode
+    pending = pending_renditions(track_info, quality, output_dir, renditions)
+    if not pending:
+        signals.log_signal.emit(f"Skipping already downloaded: {track_info.name}")
+        if csv_path:
+            update_track_status(csv_path, track_info.name)
+        return True
+
+    if resolved is None:
+        with span('resolve', track=track_info.name):
+            resolved = resolve_track(track_info)
+
+    duration_ms = track_info.duration_ms or (resolved.get('duration') or 0) * 1000
+    output_kbps = sum(int(rendition.bitrate) for rendition, _ in pending)
+    with scratch.job(estimate_scratch_bytes(duration_ms, output_kbps)) as job_dir:
+        # The source only has to be good enough for the highest bitrate being produced
+        ydl_opts = dict(SEARCH_OPTS, **{
+            'format': audio_format_selector(max(int(rendition.bitrate) for rendition, _ in pending)),
+            'outtmpl': str(job_dir / "source.%(ext)s"),
+            'paths': {'home': str(job_dir), 'temp': str(job_dir)},
+            'retries': 3,
+        }, **shaper.ydl_options())
+        transferred = []
+        ydl_opts['progress_hooks'].append(_transfer_counter(transferred))
+
+        wanted = SEGMENT_CONNECTIONS if duration_ms >= SEGMENTED_MIN_DURATION_SECONDS * 1000 else 1
+        with connections.reserve(wanted) as granted:
+            ydl_opts.update(segmented_options(granted, rate_limited=bool(shaper.effective_rate())))
+            with span('download', track=track_info.name, connections=granted), \
+                    yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.process_ie_result(dict(resolved), download=True)
+        if info:
+            signals.log_signal.emit(
+                f"Fetched {sum(transferred) / 1024 / 1024:.1f} MB (format {info.get('format_id')}, "
+                f"{_format_kbps(info):.0f} kbps) for: {track_info.name}"
+            )
+
+        source = _downloaded_file(info, job_dir)
+        # The Spotify duration, unless the search had to settle for a shorter video
+        expected_seconds = min(filter(None, (duration_ms / 1000, (info or resolved).get('duration'))), default=None)
+        outputs = [(rendition, job_dir / f"{i}-{path.name}") for i, (rendition, path) in enumerate(pending)]
+        with span('encode', track=track_info.name, renditions=len(outputs)):
+            encode_renditions(source, outputs)
+        source.unlink()
+
+        with span('artwork', track=track_info.name):
+            thumbnail_data, thumbnail_mime = load_artwork(track_info, info, shaper)
+        if thumbnail_data:
+            signals.log_signal.emit(f"Added artwork to: {track_info.name}")
+        else:
+            signals.log_signal.emit(f"No artwork found for: {track_info.name}")
+
+        for (rendition, staged), (_, final_path) in zip(outputs, pending):
+            try:
+                with span('tag', track=track_info.name):
+                    write_id3_tags(staged, track_info, thumbnail_data, thumbnail_mime, expected_seconds)
+            except Exception as e:
+                signals.log_signal.emit(f"Metadata error for {track_info.name}: {e}")
+
+            # IntegrityError is transient, so a truncated file is fetched again by the retry
+            with span('verify', track=track_info.name):
+                verify_mp3(staged, expected_seconds)
+
+            with span('publish', track=track_info.name):
+                final_path.parent.mkdir(parents=True, exist_ok=True)
+                publish_file(staged, final_path)
+        if len(outputs) > 1:
+            signals.log_signal.emit(
+                f"Encoded {', '.join(f'{r.bitrate}k {r.format}' for r, _ in outputs)} for: {track_info.name}"
+            )
+
+    if csv_path:
+        update_track_status(csv_path, track_info.name)
     return True
 
 # ========== Spotify Playlist ==========
+# Multiple artists are stored in one CSV column and split again for the TPE1 frame
+ARTIST_SEPARATOR = '; '
+SPOTIFY_TRACKS_BATCH = 50
+SPOTIFY_ENRICH_WORKERS = 4
+
+
+def track_from_spotify(track, album=None):
+    album = album or track.get('album') or {}
+    artists = [a['name'] for a in track.get('artists') or []]
+    primary_artist = artists[0] if artists else ''
+    images = album.get('images') or []
+    return Track(
+        name=track['name'],
+        artist=primary_artist,
+        album=album.get('name'),
+        thumbnail_url=images[0]['url'] if images else None,
+        search_query=f"{track['name']} {primary_artist}",
+        id=track.get('id'),
+        isrc=(track.get('external_ids') or {}).get('isrc'),
+        duration_ms=track.get('duration_ms'),
+        track_number=track.get('track_number'),
+        disc_number=track.get('disc_number'),
+        artists=ARTIST_SEPARATOR.join(artists),
+        release_date=album.get('release_date'),
+    )
+
+
 def get_playlist_tracks(playlist_id_or_url):
     if not sp:
         raise ValueError("Spotify client not configured.")
@@ -240,13 +680,7 @@ def get_playlist_tracks(playlist_id_or_url):
             track = item['track']
             if not track:
                 continue
-            tracks.append({
-                'name': track['name'],
-                'artist': track['artists'][0]['name'],
-                'album': track['album']['name'],
-                'thumbnail_url': track['album']['images'][0]['url'] if track['album']['images'] else None,
-                'search_query': f"{track['name']} {track['artists'][0]['name']}"
-            })
+            tracks.append(track_from_spotify(track))
         results = sp.next(results) if results and results.get('next') else None
     return tracks
 
@@ -256,101 +690,435 @@ def get_album_tracks(album_id_or_url):
         raise ValueError("Spotify client not configured.")
     # Fetch album for cover art and name
     album = sp.album(album_id_or_url)
-    album_name = album.get('name')
-    album_images = album.get('images') or []
-    album_cover = album_images[0]['url'] if album_images else None
 
     results = sp.album_tracks(album_id_or_url)
     tracks = []
     while results:
         for item in results['items']:
-            artists = item['artists']
-            primary_artist = artists[0]['name'] if artists else ''
-            tracks.append({
-                'name': item['name'],
-                'artist': primary_artist,
-                'album': album_name,
-                'thumbnail_url': album_cover,
-                'search_query': f"{item['name']} {primary_artist}"
-            })
+            tracks.append(track_from_spotify(item, album))
         results = sp.next(results) if results and results.get('next') else None
     return tracks
 
 
+def _fetch_full_tracks(track_ids):
+    return sp.tracks(track_ids).get('tracks') or []
+
+
+def enrich_tracks(tracks, max_workers=SPOTIFY_ENRICH_WORKERS):
+    # Simplified track objects (album listings) lack ISRC and other details;
+    # fill them in with bulk /tracks lookups of up to 50 IDs per request.
+    if not sp:
+        return tracks
+    missing = list(dict.fromkeys(t.id for t in tracks if t.id and not t.isrc))
+    if not missing:
+        return tracks
+
+    batches = [missing[i:i + SPOTIFY_TRACKS_BATCH] for i in range(0, len(missing), SPOTIFY_TRACKS_BATCH)]
+    full_tracks = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_fetch_full_tracks, batch) for batch in batches]
+        for future in as_completed(futures):
+            try:
+                for track in future.result():
+                    if track:
+                        full_tracks[track['id']] = track
+            except Exception as e:
+                signals.log_signal.emit(f"Failed to enrich tracks: {e}")
+
+    for track in tracks:
+        full = full_tracks.get(track.id)
+        if not full:
+            continue
+        details = track_from_spotify(full)
+        for field in ('isrc', 'duration_ms', 'track_number', 'disc_number', 'artists', 'release_date'):
+            value = getattr(details, field)
+            if value:
+                setattr(track, field, value)
+    signals.log_signal.emit(f"Enriched {len(full_tracks)} tracks in {len(batches)} requests")
+    return tracks
+
+
+# ========== Library Retag ==========
+def library_renditions(output_dir):
+    # The files a library holds per track: the main MP3 plus the configured EXTRA_RENDITIONS.
+    # Paths never depend on the bitrate, so the main rendition's quality is irrelevant here.
+    return job_renditions('320', output_dir=output_dir)
+
+
+def retag_track(track_info, output_dir, refresh_artwork=False, renditions=None):
+    files = [path for _, path in rendition_targets(track_info, '320', output_dir, renditions) if path.exists()]
+    if not files:
+        return 'missing'
+
+    stale = [(path, read_tag_markers(path)) for path in files]
+    if not refresh_artwork:
+        stale = [(path, markers) for path, markers in stale
+                 if markers.get(TAG_SIGNATURE_DESC) != tag_signature(track_info)]
+    if not stale:
+        return 'unchanged'
+
+    fetched = []
+
+    def fetch_artwork_once():
+        # Every rendition gets the same cover, so it is downloaded at most once per track
+        if not fetched:
+            fetched.append(load_artwork(track_info))
+        return fetched[0]
+
+    artwork_source = track_info.thumbnail_url or ''
+    for mp3_file, markers in stale:
+        thumbnail_data, thumbnail_mime = None, 'image/jpeg'
+        if artwork_source and (refresh_artwork or markers.get(TAG_ARTWORK_DESC) != artwork_source):
+            thumbnail_data, thumbnail_mime = fetch_artwork_once()
+        if not thumbnail_data:
+            # Keep the cover that is already embedded rather than replacing it
+            try:
+                covers = ID3(mp3_file).getall('APIC')
+            except ID3NoHeaderError:
+                covers = []
+            if covers:
+                thumbnail_data, thumbnail_mime = covers[0].data, covers[0].mime
+            elif not artwork_source:
+                thumbnail_data, thumbnail_mime = fetch_artwork_once()
+
+        write_id3_tags(mp3_file, track_info, thumbnail_data, thumbnail_mime, markers.get(TAG_EXPECTED_SECONDS_DESC))
+    return 'retagged'
+
+
+def _retag_worker(args):
+    track_info, output_dir, refresh_artwork, renditions = args
+    try:
+        return track_info.name, retag_track(track_info, output_dir, refresh_artwork, renditions)
+    except Exception as e:
+        return track_info.name, f"error: {e}"
+
+
+def retag_library(output_dir, refresh_artwork=False, max_workers=None, cancel_event=None):
+    # Rewrites tags of already downloaded files from playlist.csv, in every rendition
+    # folder; media is never re-fetched
+    output_dir = Path(output_dir).expanduser().resolve()
+    csv_path = output_dir / "playlist.csv"
+    if not csv_path.exists():
+        signals.log_signal.emit(f"No playlist.csv found in {output_dir}")
+        signals.done_signal.emit()
+        return
+    try:
+        renditions = library_renditions(output_dir)
+    except ValueError as e:
+        signals.log_signal.emit(str(e))
+        signals.done_signal.emit()
+        return
+
+    tracks = load_playlist_from_csv(csv_path)
+    signals.log_signal.emit(f"Retagging {len(tracks)} tracks in {output_dir}")
+
+    counts = {'retagged': 0, 'unchanged': 0, 'missing': 0, 'error': 0}
+    jobs = [(track, str(output_dir), refresh_artwork, renditions) for track in tracks]
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        for name, status in executor.map(_retag_worker, jobs, chunksize=64):
+            if cancel_event is not None and cancel_event.is_set():
+                executor.shutdown(wait=False, cancel_futures=True)
+                signals.log_signal.emit("Retag cancelled")
+                break
+            if status.startswith('error'):
+                counts['error'] += 1
+                signals.log_signal.emit(f"Retag {status} ({name})")
+            else:
+                counts[status] += 1
+                if status == 'retagged':
+                    signals.log_signal.emit(f"Retagged: {name}")
+
+    signals.log_signal.emit(
+        f"Retag finished: {counts['retagged']} retagged, {counts['unchanged']} unchanged, "
+        f"{counts['missing']} missing, {counts['error']} failed"
+    )
+    signals.done_signal.emit()
+
+
+# ========== Library Verify ==========
+def expected_seconds_of(mp3_file):
+    # The length recorded when the file was downloaded. Files without it only get the
+    # structural checks, because the Spotify length alone would flag shorter edits that
+    # the download deliberately accepted.
+    try:
+        value = read_tag_markers(mp3_file).get(TAG_EXPECTED_SECONDS_DESC)
+        return float(value) if value else None
+    except (OSError, ValueError):
+        return None
+
+
+def verify_library(output_dir, quality=None, redownload=True, max_workers=VERIFY_WORKERS, cancel_event=None):
+    # Checks downloaded files (every rendition) from their frame headers only; bad or
+    # missing files are deleted, marked not downloaded in playlist.csv and, with
+    # redownload, fetched again
+    output_dir = Path(output_dir).expanduser().resolve()
+    csv_path = output_dir / "playlist.csv"
+    if not csv_path.exists():
+        signals.log_signal.emit(f"No playlist.csv found in {output_dir}")
+        signals.done_signal.emit()
+        return
+    try:
+        renditions = library_renditions(output_dir)
+    except ValueError as e:
+        signals.log_signal.emit(str(e))
+        signals.done_signal.emit()
+        return
+
+    tracks = [track for track in load_playlist_from_csv(csv_path) if track.downloaded]
+    signals.log_signal.emit(f"Verifying {len(tracks)} downloaded tracks in {output_dir}")
+
+    # bad maps each track to the bitrate of its main file, when that file was readable
+    by_path, main_file, bad = {}, {}, {}
+    for track in tracks:
+        paths = [path for _, path in rendition_targets(track, '320', output_dir, renditions)]
+        main_file[track] = paths[0]
+        for path in paths:
+            if path.exists():
+                by_path[path] = track
+            else:
+                bad.setdefault(track, None)
+                signals.log_signal.emit(f"Missing file: {path}")
+
+    ok = 0
+    for path, _, error in scan_files(list(by_path), expected_seconds_of, max_workers):
+        if cancel_event is not None and cancel_event.is_set():
+            signals.log_signal.emit("Verify cancelled")
+            break
+        if not error:
+            ok += 1
+        else:
+            track = by_path[path]
+            bad.setdefault(track, None)
+            if path == main_file[track]:
+                bad[track] = file_bitrate(path)
+            path.unlink(missing_ok=True)
+            signals.log_signal.emit(f"Bad file ({error}): {path}")
+
+    for track in bad:
+        update_track_status(csv_path, track.name, downloaded=False)
+    flush_track_status(csv_path)
+    signals.log_signal.emit(f"Verify finished: {ok} files ok, {len(bad)} tracks with bad or missing files")
+
+    if redownload and bad and not (cancel_event is not None and cancel_event.is_set()):
+        signals.log_signal.emit(f"Re-downloading {len(bad)} tracks")
+        fixed = 0
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            futures = {}
+            for track, bitrate in bad.items():
+                # Only the missing renditions are fetched; a main file that is still fine keeps its bitrate
+                bitrate = quality or bitrate or file_bitrate(main_file[track]) or '320'
+                track_renditions = [Rendition('mp3', bitrate)] + renditions[1:]
+                future = executor.submit(download_from_youtube, track, str(bitrate), output_dir, csv_path,
+                                         renditions=track_renditions)
+                futures[future] = track
+            for future in as_completed(futures):
+                if cancel_event is not None and cancel_event.is_set():
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    signals.log_signal.emit("Re-download cancelled")
+                    break
+                try:
+                    future.result()
+                    fixed += 1
+                except Exception as e:
+                    signals.log_signal.emit(f"Re-download failed for {futures[future].name}: {classify(e)[1]}")
+        flush_track_status(csv_path)
+        signals.log_signal.emit(f"Re-downloaded {fixed} of {len(bad)} tracks")
+    signals.done_signal.emit()
+
+
 # ========== Demo Playlist ==========
 BASE_DIR = Path(__file__).resolve().parent if '__file__' in globals() else Path.cwd()
 
 DEMO_TRACKS = [
-    {
-        'name': "Hypnotize",
-        'artist': "The Notorious B.I.G.",
-        'album': "Life After Death",
-        'thumbnail_url': None,  # Let YouTube thumbnail be used
-        'search_query': "Hypnotize The Notorious B.I.G."
-    },
-    {
-        'name': "Still D.R.E.",
-        'artist': "Dr. Dre ft. Snoop Dogg",
-        'album': "2001",
-        'thumbnail_url': None,  # Let YouTube thumbnail be used
-        'search_query': "Still D.R.E. Dr. Dre Snoop Dogg"
-    },
+    Track(
+        name="Hypnotize",
+        artist="The Notorious B.I.G.",
+        album="Life After Death",
+        thumbnail_url=None,  # Let YouTube thumbnail be used
+        search_query="Hypnotize The Notorious B.I.G."
+    ),
+    Track(
+        name="Still D.R.E.",
+        artist="Dr. Dre ft. Snoop Dogg",
+        album="2001",
+        thumbnail_url=None,  # Let YouTube thumbnail be used
+        search_query="Still D.R.E. Dr. Dre Snoop Dogg"
+    ),
 ]
 
-def process_demo_playlist(quality, output_dir):
+def process_demo_playlist(quality, output_dir, cancel_event=None, bandwidth_limit=None, renditions=None):
     signals.log_signal.emit("Using demo playlist")
-    for track in DEMO_TRACKS:
-        try:
-            download_from_youtube(track, quality, output_dir)
-        except Exception as e:
-            signals.log_signal.emit(f"Demo download error for {track.get('name', 'Unknown')}: {e}")
+    shaper = job_bandwidth(bandwidth_limit)
+    try:
+        renditions = renditions or job_renditions(quality, output_dir=output_dir)
+        check_renditions(renditions, output_dir)
+    except ValueError as e:
+        signals.log_signal.emit(str(e))
+        signals.done_signal.emit()
+        return
+    signals.tracks_signal.emit([[track.name, track.artist, track.album] for track in DEMO_TRACKS])
+    with profile_run('demo', log=signals.log_signal.emit):
+        for row, track in enumerate(DEMO_TRACKS):
+            if cancel_event is not None and cancel_event.is_set():
+                break
+            signals.track_status_signal.emit(row, 'active', '')
+            try:
+                download_from_youtube(track, quality, output_dir, shaper=shaper, renditions=renditions)
+                signals.track_status_signal.emit(row, 'done', '')
+            except Exception as e:
+                signals.track_status_signal.emit(row, 'failed', classify(e)[1])
+                signals.log_signal.emit(f"Demo download error for {track.name or 'Unknown'}: {e}")
     signals.done_signal.emit()
 
 
 # ========== Batch Download Manager ==========
 class BatchDownloader:
-    def __init__(self, batch_size=200, delay_minutes=5):
+    def __init__(self, batch_size=BATCH_SIZE, delay_minutes=BATCH_DELAY_MINUTES, max_workers=MAX_WORKERS,
+                 backend=EXECUTOR_BACKEND, autotune=AUTOTUNE,
+                 autotune_bounds=(AUTOTUNE_MIN_WORKERS, AUTOTUNE_MAX_WORKERS), cancel_event=None,
+                 bandwidth_limit=None, renditions=None, force_retry=False):
         self.batch_size = batch_size
         self.delay_minutes = delay_minutes
+        self.max_workers = max_workers
+        self.backend = backend
+        self.autotune = autotune
+        self.autotune_bounds = autotune_bounds
+        # Set from another thread to stop submitting tracks; in-flight tracks finish normally
+        self.cancel_event = cancel_event or threading.Event()
+        # Every track of this job draws from the same per-job bucket, under the global cap
+        self.shaper = job_bandwidth(bandwidth_limit)
+        # None means the job's quality plus the configured EXTRA_RENDITIONS
+        if renditions:
+            check_renditions(renditions)
+        self.renditions = renditions
+        # Also retry tracks whose last failure is still in the negative cache
+        self.force_retry = force_retry
         self.chunk_times = {}
 
     def process_tracks(self, tracks, quality, output_dir):
+        from executors import TrackExecutor
+
+        # Missing ffmpeg fails every track the same way; stop before any work is scheduled
+        try:
+            check_ffmpeg()
+        except FatalError as e:
+            signals.log_signal.emit(str(e))
+            return
+        try:
+            renditions = self.renditions or job_renditions(quality, output_dir=output_dir)
+            check_renditions(renditions, output_dir)
+        except ValueError as e:
+            signals.log_signal.emit(str(e))
+            return
+
+        # Saving resets every status, so the in-memory list is the work list; no need to read it back
         csv_path = save_playlist_to_csv(tracks, output_dir)
-        remaining_tracks = load_playlist_from_csv(csv_path)
-        remaining_tracks = [t for t in remaining_tracks if not t['downloaded']]
-        
+        dead_letters = DeadLetters(output_dir, NEGATIVE_CACHE_TTL_HOURS)
+        signals.tracks_signal.emit([[track.name, track.artist, track.album] for track in tracks])
+        row_of = {id(track): row for row, track in enumerate(tracks)}
+
+        def set_status(track, status, detail=''):
+            signals.track_status_signal.emit(row_of[id(track)], status, detail)
+
+        remaining_tracks = tracks
+        if not self.force_retry and len(dead_letters):
+            remaining_tracks = []
+            for track in tracks:
+                entry = dead_letters.active(track)
+                if entry:
+                    set_status(track, 'skipped', entry['reason'])
+                else:
+                    remaining_tracks.append(track)
+            skipped = len(tracks) - len(remaining_tracks)
+            if skipped:
+                signals.log_signal.emit(
+                    f"Skipping {skipped} tracks that failed permanently on an earlier run "
+                    f"(see {dead_letters.path.name}; force a retry to try them again)"
+                )
+
         total_batches = (len(remaining_tracks) + self.batch_size - 1) // self.batch_size
         signals.log_signal.emit(f"Processing {len(remaining_tracks)} tracks in {total_batches} batches")
 
-        for batch_num, i in enumerate(range(0, len(remaining_tracks), self.batch_size), 1):
-            batch = remaining_tracks[i:i + self.batch_size]
-            signals.log_signal.emit(f"Starting batch {batch_num}/{total_batches}")
-            
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = [
-                    executor.submit(download_from_youtube, track, quality, output_dir, csv_path)
-                    for track in batch
-                ]
-                for future in as_completed(futures):
-                    try:
-                        future.result()
-                    except Exception as e:
-                        signals.log_signal.emit(f"Download error: {e}")
-
-            signals.log_signal.emit(f"Completed batch {batch_num}/{total_batches}")
-            signals.batch_complete_signal.emit()
-            
-            if batch_num < total_batches:
-                delay = self.delay_minutes * 60
-                signals.log_signal.emit(f"Waiting {self.delay_minutes} minutes before next batch...")
-                time.sleep(delay)
+        # The pool is sized for the upper bound; the limiter decides how many tracks are in flight
+        limiter = ConcurrencyLimiter(self.max_workers)
+        tuner = None
+        pool_size = self.max_workers
+        if self.autotune:
+            min_workers, max_workers = self.autotune_bounds
+            limiter.set_limit(min(max(self.max_workers, min_workers), max_workers))
+            pool_size = max_workers
+            tuner = ThroughputAutotuner(limiter, min_workers, max_workers, log=signals.log_signal.emit)
+            tuner.start()
 
+        def on_track_done(future):
+            limiter.release()
+            if tuner:
+                # Permanent failures say nothing about the concurrency level
+                exc = None if future.cancelled() else future.exception()
+                tuner.record(not future.cancelled() and (exc is None or not is_transient(exc)))
 
-# ========== Main Playlist Handler ==========
-def process_spotify_playlist(playlist_or_album_url, quality, output_dir):
-    output_dir = Path(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
+        fatal = []
+        try:
+            with TrackExecutor(self.backend, pool_size, shaper=self.shaper, renditions=renditions) as executor:
+                for batch_num, i in enumerate(range(0, len(remaining_tracks), self.batch_size), 1):
+                    batch = remaining_tracks[i:i + self.batch_size]
+                    signals.log_signal.emit(f"Starting batch {batch_num}/{total_batches}")
+
+                    futures = {}
+                    for track in batch:
+                        if self.cancel_event.is_set() or fatal:
+                            break
+                        with span('wait_for_slot', cat='scheduler'):
+                            limiter.acquire()
+                        set_status(track, 'active')
+                        future = executor.submit(track, quality, output_dir, csv_path)
+                        future.add_done_callback(on_track_done)
+                        futures[future] = track
+
+                    for future in as_completed(futures):
+                        track = futures[future]
+                        try:
+                            future.result()
+                        except Exception as e:
+                            kind, reason = classify(e)
+                            set_status(track, 'failed', reason if kind != PERMANENT else f"permanent: {reason}")
+                            if kind == PERMANENT:
+                                dead_letters.record(track, reason)
+                                signals.log_signal.emit(f"Permanent failure for {track.name}: {reason}")
+                            elif kind == FATAL:
+                                fatal.append(reason)
+                            else:
+                                signals.log_signal.emit(f"Download error: {e}")
+                        else:
+                            set_status(track, 'done')
+                            dead_letters.clear(track)
+
+                    signals.log_signal.emit(f"Completed batch {batch_num}/{total_batches}")
+                    signals.batch_complete_signal.emit()
 
+                    if fatal:
+                        signals.log_signal.emit(f"Stopping download: {fatal[0]}")
+                        break
+                    if self.cancel_event.is_set():
+                        signals.log_signal.emit("Download cancelled")
+                        break
+
+                    if batch_num < total_batches:
+                        delay = self.delay_minutes * 60
+                        signals.log_signal.emit(f"Waiting {self.delay_minutes} minutes before next batch...")
+                        if tuner:
+                            tuner.pause()
+                        self.cancel_event.wait(delay)
+                        if tuner:
+                            tuner.resume()
+        finally:
+            if tuner:
+                tuner.stop()
+            flush_track_status(csv_path)
+
+
+# ========== Main Playlist Handler ==========
+def resolve_spotify_tracks(playlist_or_album_url):
     is_album = 'spotify.com/album/' in playlist_or_album_url or '/album/' in playlist_or_album_url
     entity = 'album' if is_album else 'playlist'
     signals.log_signal.emit(f"Fetching Spotify {entity}...")
@@ -362,14 +1130,30 @@ def process_spotify_playlist(playlist_or_album_url, quality, output_dir):
         tracks = get_album_tracks(entity_id) if is_album else get_playlist_tracks(entity_id)
     except Exception as e:
         signals.log_signal.emit(f"Failed to load {entity}: {e}")
-        return
+        return None
 
     if not tracks:
         signals.log_signal.emit("No tracks found.")
-        return
+        return None
 
     signals.log_signal.emit(f"Found {len(tracks)} tracks")
+    enrich_tracks(tracks)
+    return tracks
 
-    downloader = BatchDownloader(batch_size=200, delay_minutes=5)
-    downloader.process_tracks(tracks, quality, output_dir)
+
+def process_spotify_playlist(playlist_or_album_url, quality, output_dir, cancel_event=None, bandwidth_limit=None,
+                             renditions=None, force_retry=False):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with profile_run('playlist', log=signals.log_signal.emit):
+        with span('spotify', cat='spotify'):
+            tracks = resolve_spotify_tracks(playlist_or_album_url)
+        if not tracks:
+            return False
+
+        downloader = BatchDownloader(cancel_event=cancel_event, bandwidth_limit=bandwidth_limit, renditions=renditions,
+                                     force_retry=force_retry)
+        downloader.process_tracks(tracks, quality, output_dir)
     signals.done_signal.emit()
+    return True
@@ -0,0 +1,275 @@
+"""
+Pluggable execution backends for per-track downloads.
+
+threads    - everything runs in a thread pool (lowest overhead, GIL-bound extraction)
+processes  - every track runs start to finish in a worker process
+hybrid     - worker processes resolve/extract, parent threads download, encode and tag
+
+Worker processes cannot reach the GUI signals, so their signal emits are sent
+through a multiprocessing queue and re-emitted in the parent by a pump thread.
+State that all transfers must share lives in a broker process instead: the
+job's bandwidth buckets, the connection budget and scratch admission. Workers
+reach it through proxies, so the caps hold for the whole job however many
+worker processes are started.
+"""
+
+import multiprocessing
+import os
+import queue as queue_module
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.managers import BaseManager, BaseProxy
+
+import downloader
+from bandwidth import ConnectionBudget, JobBandwidth
+from staging import ScratchSpace
+
+BACKENDS = ('threads', 'processes', 'hybrid')
+FORWARDED_SIGNALS = ('log_signal', 'done_signal', 'batch_complete_signal')
+
+
+class _ForwardedSignal:
+    def __init__(self, events, name):
+        self._events = events
+        self._name = name
+
+    def emit(self, *args):
+        self._events.put((self._name, args))
+
+
+class ForwardingSignals:
+    """Stand-in for downloader.signals inside worker processes"""
+
+    def __init__(self, events):
+        for name in FORWARDED_SIGNALS:
+            setattr(self, name, _ForwardedSignal(events, name))
+
+
+class ScratchSpaceProxy(BaseProxy):
+    """Admission runs in the broker; the job directory is cleaned up locally"""
+    _exposed_ = ('reserve', 'release', 'new_job_dir')
+
+    def reserve(self, estimate):
+        return self._callmethod('reserve', (estimate,))
+
+    def release(self, estimate):
+        return self._callmethod('release', (estimate,))
+
+    def new_job_dir(self):
+        return self._callmethod('new_job_dir')
+
+    job = ScratchSpace.job
+
+
+class JobBandwidthProxy(BaseProxy):
+    """Tokens are taken in the broker; the yt-dlp hook and chunk loop run locally"""
+    _exposed_ = ('throttle', 'effective_rate')
+
+    def throttle(self, nbytes):
+        return self._callmethod('throttle', (nbytes,))
+
+    def effective_rate(self):
+        return self._callmethod('effective_rate')
+
+    ydl_options = JobBandwidth.ydl_options
+    iter_content = JobBandwidth.iter_content
+
+
+class ConnectionBudgetProxy(BaseProxy):
+    _exposed_ = ('acquire', 'release')
+
+    def acquire(self, wanted):
+        return self._callmethod('acquire', (wanted,))
+
+    def release(self, granted):
+        return self._callmethod('release', (granted,))
+
+    reserve = ConnectionBudget.reserve
+
+
+class Broker(BaseManager):
+    """Process that holds the state all worker processes must share"""
+
+
+Broker.register('ScratchSpace', ScratchSpace, proxytype=ScratchSpaceProxy)
+Broker.register('JobBandwidth', JobBandwidth, proxytype=JobBandwidthProxy)
+Broker.register('ConnectionBudget', ConnectionBudget, proxytype=ConnectionBudgetProxy)
+
+
+_process_shaper = None
+
+
+def _init_worker_process(events, shaper=None, connections=None, scratch=None):
+    global _process_shaper
+    downloader.signals = ForwardingSignals(events)
+    _process_shaper = shaper
+    if connections is not None:
+        downloader.connections = connections
+    if scratch is not None:
+        downloader.scratch = scratch
+
+
+def _download_in_process(track, quality, output_dir, renditions=None):
+    return downloader.download_from_youtube(
+        track, quality, output_dir, shaper=_process_shaper, renditions=renditions
+    )
+
+
+class TrackExecutor:
+    """Runs download_from_youtube for tracks on the configured backend"""
+
+    def __init__(self, backend='threads', max_workers=5, process_workers=None, shaper=None, renditions=None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown executor backend: {backend} (expected one of {', '.join(BACKENDS)})")
+        self.backend = backend
+        self.max_workers = max_workers
+        self.shaper = shaper
+        self.renditions = renditions
+        self._threads = None
+        self._processes = None
+        self._events = None
+        self._pump = None
+        self._broker = None
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+        if backend in ('threads', 'hybrid'):
+            self._threads = ThreadPoolExecutor(max_workers=max_workers)
+        if backend in ('processes', 'hybrid'):
+            if backend == 'processes':
+                process_workers = max_workers
+            process_workers = process_workers or os.cpu_count()
+            # Only the processes backend transfers media inside worker processes
+            process_shaper = process_connections = process_scratch = None
+            if backend == 'processes':
+                self._broker = Broker()
+                self._broker.start()
+                shaper = shaper or downloader.job_bandwidth()
+                process_shaper = self._broker.JobBandwidth(shaper.limiter, shaper.limit_spec)
+                process_connections = self._broker.ConnectionBudget(downloader.connections.total)
+                local = downloader.scratch
+                process_scratch = self._broker.ScratchSpace(str(local.root), local.min_free_bytes, local.admit_timeout)
+            self._events = multiprocessing.get_context().Queue()
+            self._processes = ProcessPoolExecutor(
+                max_workers=process_workers,
+                initializer=_init_worker_process,
+                initargs=(self._events, process_shaper, process_connections, process_scratch)
+            )
+            self._pump = threading.Thread(target=self._pump_events, daemon=True)
+            self._pump.start()
+
+    def _pump_events(self):
+        while True:
+            try:
+                event = self._events.get(timeout=0.5)
+            except queue_module.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            if event is None:
+                return
+            name, args = event
+            getattr(downloader.signals, name).emit(*args)
+
+    def submit(self, track, quality, output_dir, csv_path=None):
+        # Coalesce tracks that write the same file before any work is scheduled, so
+        # duplicates never reach separate worker processes
+        key = downloader.download_key(track, output_dir)
+        with self._inflight_lock:
+            leader = self._inflight.get(key)
+            if leader is None:
+                future = self._inflight[key] = self._submit(track, quality, output_dir, csv_path)
+        if leader is None:
+            future.add_done_callback(lambda f: self._forget(key, f))
+            return future
+
+        follower = Future()
+
+        def on_leader_done(f):
+            if not f.cancelled() and f.exception() is None:
+                downloader.signals.log_signal.emit(f"Reused in-flight download for: {track.name}")
+                if csv_path:
+                    downloader.update_track_status(csv_path, track.name)
+            _copy_result(f, follower)
+
+        leader.add_done_callback(on_leader_done)
+        return follower
+
+    def _forget(self, key, future):
+        with self._inflight_lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _submit(self, track, quality, output_dir, csv_path):
+        if self.backend == 'threads':
+            return self._threads.submit(
+                downloader.download_from_youtube, track, quality, output_dir, csv_path,
+                shaper=self.shaper, renditions=self.renditions
+            )
+
+        if self.backend == 'processes':
+            future = self._processes.submit(_download_in_process, track, quality, output_dir, self.renditions)
+            # The CSV is only ever written from the parent process
+            if csv_path:
+                future.add_done_callback(lambda f: self._mark_downloaded(f, csv_path, track))
+            return future
+
+        # hybrid: resolve in a process, then download in a parent thread. Tracks whose
+        # files all exist skip the search and are only marked downloaded.
+        if not downloader.pending_renditions(track, quality, output_dir, self.renditions):
+            return self._threads.submit(
+                downloader.download_from_youtube, track, quality, output_dir, csv_path,
+                shaper=self.shaper, renditions=self.renditions
+            )
+        outer = Future()
+        resolving = self._processes.submit(downloader.resolve_track_with_retry, track)
+
+        def on_resolved(f):
+            if f.cancelled():
+                outer.cancel()
+                return
+            if f.exception() is not None:
+                outer.set_exception(f.exception())
+                return
+            inner = self._threads.submit(
+                downloader.download_from_youtube, track, quality, output_dir, csv_path, f.result(),
+                self.shaper, self.renditions
+            )
+            inner.add_done_callback(lambda g: _copy_result(g, outer))
+
+        resolving.add_done_callback(on_resolved)
+        return outer
+
+    @staticmethod
+    def _mark_downloaded(future, csv_path, track):
+        if not future.cancelled() and future.exception() is None:
+            downloader.update_track_status(csv_path, track.name)
+
+    def shutdown(self, wait=True):
+        if self._processes:
+            self._processes.shutdown(wait=wait)
+        if self._threads:
+            self._threads.shutdown(wait=wait)
+        if self._events is not None:
+            self._events.put(None)
+            if wait and self._pump:
+                self._pump.join(timeout=5)
+        # Workers still running after shutdown(wait=False) keep using the broker
+        if self._broker is not None and wait:
+            self._broker.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=True)
+        return False
+
+
+def _copy_result(source, target):
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
@@ -0,0 +1,125 @@
+"""
+Failure classification, negative cache and dead-letter list.
+
+classify() sorts download errors into three kinds:
+
+    transient  network trouble, throttling, server errors: retried with backoff
+    permanent  the track cannot succeed as it is (no search results, video removed,
+               private or region-blocked, no usable audio format): not retried,
+               recorded in dead_letter.csv with the reason, and skipped by later
+               runs until the entry expires or a retry is forced
+    fatal      the run itself is broken (ffmpeg missing): the run stops, and
+               nothing is recorded against the track
+
+dead_letter.csv sits next to playlist.csv. Entries that have not expired yet
+form the negative cache. Expired entries stay in the file as a record until
+the track succeeds.
+"""
+
+import csv
+import os
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+
+TRANSIENT, PERMANENT, FATAL = 'transient', 'permanent', 'fatal'
+DEAD_LETTER_FILE = 'dead_letter.csv'
+DEAD_LETTER_FIELDS = ['search_query', 'name', 'artist', 'reason', 'failures', 'failed_at', 'expires_at']
+
+# Lower-case fragments of yt-dlp/YouTube messages for failures that retrying cannot fix
+PERMANENT_PATTERNS = (
+    'video unavailable',
+    'this video has been removed',
+    'this video is not available',
+    'not available in your country',
+    'blocked it in your country',
+    'private video',
+    'confirm your age',
+    'inappropriate for some users',
+    'copyright',
+    'account associated with this video has been terminated',
+    'members-only',
+    'join this channel',
+    'requested format is not available',
+)
+
+
+class PermanentError(Exception):
+    """A track failure that retrying cannot fix"""
+
+
+class FatalError(EnvironmentError):
+    """A failure that affects every track, so the run should stop"""
+
+
+def failure_reason(exc):
+    message = str(exc).strip().splitlines()[0] if str(exc).strip() else type(exc).__name__
+    return message.removeprefix('ERROR: ')[:300]
+
+
+def classify(exc):
+    """Return (kind, reason) for an exception raised while downloading a track"""
+    reason = failure_reason(exc)
+    if isinstance(exc, FatalError):
+        return FATAL, reason
+    if isinstance(exc, PermanentError):
+        return PERMANENT, reason
+    message = str(exc).lower()
+    if any(pattern in message for pattern in PERMANENT_PATTERNS):
+        return PERMANENT, reason
+    return TRANSIENT, reason
+
+
+def is_transient(exc):
+    return classify(exc)[0] == TRANSIENT
+
+
+class DeadLetters:
+    """Permanently failed tracks of one download folder, keyed by search query"""
+
+    def __init__(self, output_dir, ttl_hours):
+        self.path = Path(output_dir) / DEAD_LETTER_FILE
+        self.ttl = timedelta(hours=ttl_hours)
+        self._lock = threading.Lock()
+        self._entries = {}
+        if self.path.exists():
+            with open(self.path, newline='', encoding='utf-8') as f:
+                self._entries = {row['search_query']: row for row in csv.DictReader(f)}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def active(self, track, now=None):
+        """The unexpired entry for track, or None"""
+        entry = self._entries.get(track.search_query)
+        if entry and datetime.fromisoformat(entry['expires_at']) > (now or datetime.now()):
+            return entry
+        return None
+
+    def record(self, track, reason):
+        now = datetime.now()
+        with self._lock:
+            previous = self._entries.get(track.search_query) or {}
+            self._entries[track.search_query] = {
+                'search_query': track.search_query,
+                'name': track.name,
+                'artist': track.artist,
+                'reason': reason,
+                'failures': int(previous.get('failures') or 0) + 1,
+                'failed_at': now.isoformat(timespec='seconds'),
+                'expires_at': (now + self.ttl).isoformat(timespec='seconds'),
+            }
+            self._save()
+
+    def clear(self, track):
+        with self._lock:
+            if self._entries.pop(track.search_query, None) is not None:
+                self._save()
+
+    def _save(self):
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=DEAD_LETTER_FIELDS)
+            writer.writeheader()
+            writer.writerows(self._entries.values())
+        os.replace(tmp, self.path)
@@ -1,15 +1,15 @@
 import os
-import threading
 import subprocess
 import sys
 import platform
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QTextEdit,
     QLabel, QFileDialog, QCheckBox, QSlider, QProgressBar, QGroupBox,
-    QMessageBox, QSplitter
+    QMessageBox, QSplitter, QTableView, QComboBox, QHeaderView, QAbstractItemView
 )
 from PyQt5.QtCore import Qt, QTimer
-from downloader import process_demo_playlist, process_spotify_playlist, signals
+from service import ServiceClient, ServiceError, FINISHED_STATES
+from track_table import STATUS_FILTERS, TrackFilterProxy, TrackTableModel
 from config import DEFAULT_DOWNLOAD_DIR
 from setup_wizard import check_first_run, run_setup_wizard
 
@@ -17,12 +17,14 @@ class DownloaderApp(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Spotify Playlist Downloader")
-        self.setGeometry(300, 200, 700, 500)
+        self.setGeometry(300, 200, 900, 700)
         self.setStyleSheet(self.style_sheet())
         
         self.download_dir = DEFAULT_DOWNLOAD_DIR
         self.quality = "320"  # Default quality
         self.is_downloading = False
+        self.is_retagging = False
+        self.is_verifying = False
         
         # Check for first run and show setup wizard
         if check_first_run():
@@ -48,6 +50,14 @@ class DownloaderApp(QWidget):
         # Demo checkbox
         self.demo_checkbox = QCheckBox("Demo mode")
         options_layout.addWidget(self.demo_checkbox)
+
+        # Retag option
+        self.refresh_artwork_checkbox = QCheckBox("Refresh artwork")
+        options_layout.addWidget(self.refresh_artwork_checkbox)
+
+        # Tracks in dead_letter.csv are skipped unless this is checked
+        self.force_retry_checkbox = QCheckBox("Retry failed tracks")
+        options_layout.addWidget(self.force_retry_checkbox)
         
         # Quality selector
         options_layout.addWidget(QLabel("Quality:"))
@@ -100,6 +110,19 @@ class DownloaderApp(QWidget):
             }
         """)
         
+        self.retag_button = QPushButton("Retag Library")
+        self.retag_button.setFixedHeight(35)
+        self.retag_button.clicked.connect(self.start_retag)
+
+        self.verify_button = QPushButton("Verify Library")
+        self.verify_button.setFixedHeight(35)
+        self.verify_button.clicked.connect(self.start_verify)
+
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setFixedHeight(35)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_job)
+
         self.clear_button = QPushButton("Clear")
         self.clear_button.setFixedHeight(35)
         self.clear_button.clicked.connect(self.clear_log)
@@ -109,6 +132,9 @@ class DownloaderApp(QWidget):
         self.setup_button.clicked.connect(self.run_setup)
         
         button_layout.addWidget(self.start_button)
+        button_layout.addWidget(self.retag_button)
+        button_layout.addWidget(self.verify_button)
+        button_layout.addWidget(self.cancel_button)
         button_layout.addWidget(self.clear_button)
         button_layout.addWidget(self.setup_button)
         button_layout.addStretch()
@@ -120,17 +146,58 @@ class DownloaderApp(QWidget):
         self.progress_bar.setVisible(False)
         main_layout.addWidget(self.progress_bar)
         
+        # Track table: the view only renders visible rows of the model
+        filter_layout = QHBoxLayout()
+        self.status_filter = QComboBox()
+        self.status_filter.addItems(list(STATUS_FILTERS))
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Filter tracks...")
+        self.track_counts_label = QLabel("")
+        filter_layout.addWidget(self.status_filter)
+        filter_layout.addWidget(self.search_input)
+        filter_layout.addWidget(self.track_counts_label)
+        main_layout.addLayout(filter_layout)
+
+        self.track_model = TrackTableModel(self)
+        self.track_proxy = TrackFilterProxy(self)
+        self.track_proxy.setSourceModel(self.track_model)
+        self.status_filter.currentTextChanged.connect(self.track_proxy.set_status_filter)
+        self.search_input.textChanged.connect(self.track_proxy.set_text_filter)
+
+        self.track_table = QTableView()
+        self.track_table.setModel(self.track_proxy)
+        self.track_table.setSortingEnabled(True)
+        self.track_table.sortByColumn(0, Qt.AscendingOrder)
+        self.track_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.track_table.setWordWrap(False)
+        self.track_table.verticalHeader().setVisible(False)
+        # Fixed row heights and column widths keep scrolling independent of the row count
+        self.track_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.track_table.verticalHeader().setDefaultSectionSize(24)
+        self.track_table.horizontalHeader().setSectionResizeMode(QHeaderView.Interactive)
+        self.track_table.horizontalHeader().setStretchLastSection(True)
+        for column, width in enumerate((50, 220, 150, 150, 70)):
+            self.track_table.setColumnWidth(column, width)
+
         # Log output
         self.log_output = QTextEdit()
         self.log_output.setReadOnly(True)
-        self.log_output.setMaximumHeight(200)
-        main_layout.addWidget(self.log_output)
+
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.track_table)
+        splitter.addWidget(self.log_output)
+        splitter.setSizes([350, 150])
+        main_layout.addWidget(splitter, 1)
         
         self.setLayout(main_layout)
 
-        # Connect signals
-        signals.log_signal.connect(self.append_log)
-        signals.done_signal.connect(self.on_done)
+        # Downloads run in the shared background service; poll it for job events
+        self.service = ServiceClient()
+        self.job_id = None
+        self.last_event = 0
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(500)
+        self.poll_timer.timeout.connect(self.poll_job)
         
         # Initialize UI
         self.start_button.setEnabled(True)
@@ -179,7 +246,14 @@ class DownloaderApp(QWidget):
                 border-radius: 5px;
                 padding: 10px;
                 font-size: 10pt;
-                min-height: 150px;
+                min-height: 100px;
+            }
+
+            QTableView {
+                background-color: white;
+                border: 1px solid #ddd;
+                border-radius: 5px;
+                font-size: 10pt;
             }
             
             QLabel {
@@ -217,10 +291,32 @@ class DownloaderApp(QWidget):
         else:
             self.append_log("Setup cancelled.")
 
-    def on_done(self):
+    def on_done(self, status='done'):
+        self.poll_timer.stop()
+        self.job_id = None
         self.start_button.setEnabled(True)
+        self.retag_button.setEnabled(True)
+        self.verify_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
         self.is_downloading = False
         self.progress_bar.setVisible(False)
+
+        if status != 'done':
+            self.is_retagging = False
+            self.is_verifying = False
+            self.append_log(f"Job {status}.")
+            return
+
+        if self.is_retagging:
+            self.is_retagging = False
+            self.append_log("Retag complete!")
+            return
+
+        if self.is_verifying:
+            self.is_verifying = False
+            self.append_log("Verify complete!")
+            return
+
         self.append_log("Download complete!")
         
         # Show completion message
@@ -262,7 +358,7 @@ class DownloaderApp(QWidget):
 
         if self.demo_checkbox.isChecked():
             self.append_log("Starting demo download...")
-            thread = threading.Thread(target=process_demo_playlist, args=(self.quality, self.download_dir))
+            self.submit_job('demo', quality=self.quality, output_dir=self.download_dir)
         else:
             # Validate Spotify URL
             if not playlist_url:
@@ -280,7 +376,98 @@ class DownloaderApp(QWidget):
                 return
 
             self.append_log("Starting Spotify download...")
-            thread = threading.Thread(target=process_spotify_playlist, args=(playlist_url, self.quality, self.download_dir))
+            self.submit_job('playlist', url=playlist_url, quality=self.quality, output_dir=self.download_dir,
+                            force_retry=self.force_retry_checkbox.isChecked())
+
+    def start_retag(self):
+        self.clear_log()
+        self.download_dir = self.folder_path_display.text()
+        if not os.path.isdir(self.download_dir):
+            self.append_log(f"Download directory does not exist: {self.download_dir}")
+            return
+
+        self.start_button.setEnabled(False)
+        self.retag_button.setEnabled(False)
+        self.verify_button.setEnabled(False)
+        self.is_retagging = True
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)
+
+        self.append_log("Starting library retag...")
+        self.submit_job('retag', output_dir=self.download_dir,
+                        refresh_artwork=self.refresh_artwork_checkbox.isChecked())
+
+    def start_verify(self):
+        self.clear_log()
+        self.download_dir = self.folder_path_display.text()
+        if not os.path.isdir(self.download_dir):
+            self.append_log(f"Download directory does not exist: {self.download_dir}")
+            return
+
+        self.start_button.setEnabled(False)
+        self.retag_button.setEnabled(False)
+        self.verify_button.setEnabled(False)
+        self.is_verifying = True
+        self.progress_bar.setVisible(True)
+        self.progress_bar.setRange(0, 0)
+
+        self.append_log("Starting library verify...")
+        self.submit_job('verify', output_dir=self.download_dir)
+
+    def submit_job(self, kind, **params):
+        try:
+            self.service.ensure_running()
+            job = self.service.submit(kind, **params)
+        except ServiceError as e:
+            self.append_log(f"Could not start job: {e}")
+            self.on_done('failed')
+            return
+        self.job_id = job['id']
+        self.last_event = 0
+        self.track_model.set_tracks([])
+        self.update_track_counts()
+        self.cancel_button.setEnabled(True)
+        self.poll_timer.start()
+
+    def poll_job(self):
+        if not self.job_id:
+            return
+        try:
+            result = self.service.events(self.job_id, self.last_event)
+        except ServiceError as e:
+            self.append_log(str(e))
+            self.on_done('failed')
+            return
+
+        for event in result['events']:
+            self.last_event = event['seq']
+            if event['type'] == 'log':
+                self.append_log(event['data'])
+            elif event['type'] == 'tracks':
+                self.track_model.set_tracks(event['data'])
+            elif event['type'] == 'track_status':
+                self.track_model.apply_updates(event['data'])
+        if result['events']:
+            self.update_track_counts()
+        if result['status'] in FINISHED_STATES:
+            self.on_done(result['status'])
+
+    def update_track_counts(self):
+        counts = self.track_model.counts
+        total = self.track_model.rowCount()
+        if not total:
+            self.track_counts_label.setText("")
+            return
+        self.track_counts_label.setText(
+            f"{counts['done']} done · {counts['failed']} failed · {counts['skipped']} skipped · "
+            f"{counts['pending'] + counts['active']} left of {total}"
+        )
 
-        thread.daemon = True  # Make thread daemon so it closes with the app
-        thread.start()
+    def cancel_job(self):
+        if not self.job_id:
+            return
+        try:
+            self.service.cancel(self.job_id)
+            self.append_log("Cancelling...")
+        except ServiceError as e:
+            self.append_log(f"Could not cancel job: {e}")
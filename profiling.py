@@ -0,0 +1,173 @@
+"""
+Opt-in profiling for slow runs.
+
+Set PROFILE=sample, PROFILE=trace or PROFILE=sample,trace and every playlist
+or demo job writes two files to PROFILE_DIR:
+
+    <run>-<timestamp>.folded      collapsed stacks from a wall-clock sampler of all
+                                  threads (input for flamegraph.pl or speedscope)
+    <run>-<timestamp>.trace.json  trace events with one span per track per stage per
+                                  thread (open in Perfetto or chrome://tracing)
+
+When profiling is off, span() returns one shared no-op context manager, so
+instrumented code only pays for a global lookup per stage.
+
+Both outputs cover the process that runs the job. With the processes backend
+the time spent inside worker processes only shows up as parent threads waiting.
+"""
+
+import contextlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from config import PROFILE, PROFILE_DIR, PROFILE_SAMPLE_INTERVAL_MS
+
+MODES = ('sample', 'trace')
+_NULL_SPAN = contextlib.nullcontext()
+_tracer = None
+_active = False
+_active_lock = threading.Lock()
+
+
+def parse_modes(value):
+    modes = {m.strip().lower() for m in (value or '').split(',') if m.strip()}
+    if modes & {'1', 'true', 'on', 'all'}:
+        return set(MODES)
+    modes -= {'0', 'false', 'off', 'none'}
+    unknown = modes - set(MODES)
+    if unknown:
+        raise ValueError(f"Unknown profiling mode: {', '.join(sorted(unknown))} (expected {', '.join(MODES)})")
+    return modes
+
+
+def span(name, cat='stage', **args):
+    """Time a block as one trace event on the calling thread; a no-op unless tracing"""
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, cat, args)
+
+
+class TraceRecorder:
+    """Collects complete ('X') events in the Trace Event Format"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._origin = time.perf_counter()
+        self._events = []
+        self._threads = {}
+
+    def _now_us(self):
+        return (time.perf_counter() - self._origin) * 1e6
+
+    @contextlib.contextmanager
+    def span(self, name, cat, args):
+        thread = threading.current_thread()
+        self._threads.setdefault(thread.ident, thread.name)
+        start = self._now_us()
+        try:
+            yield
+        except BaseException as e:
+            args = dict(args, error=type(e).__name__)
+            raise
+        finally:
+            # list.append is atomic, so worker threads need no lock here
+            self._events.append({
+                'name': name, 'cat': cat, 'ph': 'X', 'ts': round(start, 1),
+                'dur': round(self._now_us() - start, 1), 'pid': self.pid, 'tid': thread.ident, 'args': args,
+            })
+
+    def write(self, path):
+        metadata = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in list(self._threads.items())
+        ]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': metadata + list(self._events), 'displayTimeUnit': 'ms'}, f)
+
+
+class StackSampler:
+    """Samples every thread's stack at a fixed interval and counts identical stacks"""
+
+    def __init__(self, interval_seconds):
+        self.interval_seconds = interval_seconds
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.stacks[self._collapse(names.get(ident, str(ident)), frame)] += 1
+
+    @staticmethod
+    def _collapse(thread_name, frame):
+        # Pool threads are merged by pool ("ThreadPoolExecutor-0_3" -> "ThreadPoolExecutor-0")
+        parts = []
+        while frame is not None:
+            code = frame.f_code
+            parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        parts.append(re.sub(r'_\d+$', '', thread_name))
+        return ';'.join(reversed(parts))
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextlib.contextmanager
+def profile_run(name, modes=None, output_dir=PROFILE_DIR, log=print):
+    """Profile the enclosed run if enabled; nested runs are folded into the outer one"""
+    global _tracer, _active
+    modes = parse_modes(PROFILE) if modes is None else set(modes)
+    with _active_lock:
+        start = bool(modes) and not _active
+        if start:
+            _active = True
+    if not start:
+        yield
+        return
+
+    sampler = StackSampler(PROFILE_SAMPLE_INTERVAL_MS / 1000) if 'sample' in modes else None
+    tracer = TraceRecorder() if 'trace' in modes else None
+    if sampler:
+        sampler.start()
+    _tracer = tracer
+    try:
+        with span(name, cat='run'):
+            yield
+    finally:
+        _tracer = None
+        if sampler:
+            sampler.stop()
+        try:
+            output_dir = Path(output_dir)
+            output_dir.mkdir(parents=True, exist_ok=True)
+            stem = output_dir / f"{name}-{time.strftime('%Y%m%d-%H%M%S')}"
+            if sampler:
+                sampler.write(f"{stem}.folded")
+                log(f"Profile: wrote {stem}.folded")
+            if tracer:
+                tracer.write(f"{stem}.trace.json")
+                log(f"Profile: wrote {stem}.trace.json")
+        finally:
+            with _active_lock:
+                _active = False
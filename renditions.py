@@ -0,0 +1,79 @@
+"""
+Output renditions of a track.
+
+A rendition is a format, a bitrate and an optional target directory. All
+renditions of a track are produced from the same downloaded source by one
+ffmpeg run with one output per rendition. When target_dir is empty, the file
+goes into the job's download folder.
+
+Renditions are parsed from "format:bitrate[:dir]" entries separated by commas,
+e.g. "mp3:128:/sync/mobile". Only MP3 is supported, because tags are written
+as ID3. File names do not include the bitrate, so two renditions of the same
+format need different folders; check_renditions() rejects collisions before a
+job starts.
+"""
+
+import subprocess
+from pathlib import Path
+
+ENCODERS = {'mp3': ('libmp3lame', '.mp3')}
+
+
+class Rendition:
+    __slots__ = ('format', 'bitrate', 'target_dir')
+
+    def __init__(self, format='mp3', bitrate='320', target_dir=None):
+        if format not in ENCODERS:
+            raise ValueError(f"Unsupported rendition format: {format} (expected one of {', '.join(ENCODERS)})")
+        self.format = format
+        self.bitrate = str(int(bitrate))
+        self.target_dir = target_dir or None
+
+    @property
+    def extension(self):
+        return ENCODERS[self.format][1]
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('format', 'mp3'), data.get('bitrate', '320'), data.get('target_dir'))
+
+    def to_dict(self):
+        return {'format': self.format, 'bitrate': self.bitrate, 'target_dir': self.target_dir}
+
+    def __repr__(self):
+        return f"Rendition({self.format!r}, {self.bitrate!r}, {self.target_dir!r})"
+
+
+def parse_renditions(spec):
+    renditions = []
+    for entry in filter(None, (e.strip() for e in (spec or '').split(','))):
+        # Split at most twice so Windows paths ("C:\\Music") keep their colon
+        parts = entry.split(':', 2)
+        if len(parts) < 2:
+            raise ValueError(f"Invalid rendition: {entry!r} (expected format:bitrate[:dir])")
+        renditions.append(Rendition(parts[0].strip().lower(), parts[1].strip(), parts[2].strip() if len(parts) > 2 else None))
+    return renditions
+
+
+def check_renditions(renditions, output_dir=None):
+    """Raise ValueError if two renditions would write the same file"""
+    seen = {}
+    for rendition in renditions:
+        folder = rendition.target_dir or output_dir
+        key = (str(Path(folder).expanduser().resolve()) if folder else None, rendition.extension)
+        if key in seen:
+            where = rendition.target_dir or 'the download folder'
+            raise ValueError(f"Renditions {seen[key]!r} and {rendition!r} both write {rendition.extension} "
+                             f"files to {where}; give each one its own folder")
+        seen[key] = rendition
+
+
+def encode_renditions(source, outputs):
+    """Decode source once and encode every (rendition, path) output in a single ffmpeg run"""
+    cmd = ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-nostdin', '-y', '-i', str(source)]
+    for rendition, path in outputs:
+        encoder = ENCODERS[rendition.format][0]
+        cmd += ['-map', '0:a:0', '-vn', '-c:a', encoder, '-b:a', f"{rendition.bitrate}k", str(path)]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed ({result.returncode}): {result.stderr.strip()[-500:]}")
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Long-lived local download service.
+
+One background process owns the download engine, so Spotify/artwork sessions,
+caches, the scratch space and worker limits stay warm and are shared by every
+client. The GUI and scripts talk to it over a small JSON HTTP API bound to
+localhost:
+
+    GET    /health
+    GET    /jobs                          list jobs
+    POST   /jobs                          submit {"kind": "playlist"|"demo"|"retag"|"verify", ...}
+                                          (playlist/demo accept "bandwidth_limit", e.g. "2M", and
+                                          "renditions": [{"format", "bitrate", "target_dir"}, ...];
+                                          playlist also accepts "force_retry": true;
+                                          verify accepts "redownload": false)
+    GET    /jobs/<id>                     job summary
+    GET    /jobs/<id>/events?since=N&wait=S   events after N, long-polling up to S seconds
+                                          ("log", "status", "tracks" and batched "track_status")
+    DELETE /jobs/<id>                     cancel a queued or running job
+
+Every request except /health must carry the token from SERVICE_TOKEN_FILE in
+the X-Service-Token header. The service writes a new token on each start, in
+a file only the current user can read, so other local users cannot submit
+jobs. POST bodies must be sent as application/json, and requests with an
+Origin header are refused, so web pages cannot reach the API from a browser.
+
+Jobs run one at a time in submission order, so concurrent clients share one
+set of limits instead of multiplying them.
+"""
+
+import argparse
+import hmac
+import itertools
+import json
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from bandwidth import parse_rate
+from config import DEFAULT_DOWNLOAD_DIR, EXTRA_RENDITIONS, SERVICE_HOST, SERVICE_PORT, SERVICE_TOKEN_FILE
+from renditions import Rendition, check_renditions, parse_renditions
+
+JOB_KINDS = ('playlist', 'demo', 'retag', 'verify')
+FINISHED_STATES = ('done', 'failed', 'cancelled')
+MAX_EVENTS_PER_JOB = 20000
+MAX_FINISHED_JOBS = 100
+TOKEN_HEADER = 'X-Service-Token'
+# Per-track status changes are merged and published as one event per interval
+STATUS_FLUSH_SECONDS = 0.25
+
+
+class Job:
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        self.events = deque(maxlen=MAX_EVENTS_PER_JOB)
+
+    def summary(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'params': self.params,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'error': self.error,
+            'last_event': self.events[-1]['seq'] if self.events else 0,
+        }
+
+
+class DownloadService:
+    def __init__(self):
+        self.jobs = {}
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._seq = itertools.count(1)
+        self._current = None
+        self._status_buffer = {}
+        self._runner = threading.Thread(target=self._run, daemon=True)
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+
+    def start(self):
+        # Imported here so the client side of this module does not load the engine
+        from PyQt5.QtCore import Qt
+        from downloader import signals
+
+        signals.log_signal.connect(lambda text: self._emit('log', text), Qt.DirectConnection)
+        signals.batch_complete_signal.connect(lambda: self._emit('batch_complete', None), Qt.DirectConnection)
+        signals.tracks_signal.connect(lambda rows: self._emit('tracks', rows), Qt.DirectConnection)
+        signals.track_status_signal.connect(self._buffer_status, Qt.DirectConnection)
+        self._runner.start()
+        self._flusher.start()
+
+    # ----- events -----
+    def _emit(self, event_type, data, job=None):
+        with self._cond:
+            job = job or self._current
+            if job is None:
+                return
+            job.events.append({'seq': next(self._seq), 'type': event_type, 'data': data, 'time': time.time()})
+            self._cond.notify_all()
+
+    def _buffer_status(self, row, status, detail):
+        # Only the latest status of a row is kept until the next flush
+        with self._cond:
+            self._status_buffer[row] = (status, detail)
+
+    def _flush_statuses(self):
+        with self._cond:
+            if not self._status_buffer:
+                return
+            updates = [[row, status, detail] for row, (status, detail) in self._status_buffer.items()]
+            self._status_buffer.clear()
+        self._emit('track_status', updates)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(STATUS_FLUSH_SECONDS)
+            self._flush_statuses()
+
+    def events(self, job_id, since=0, wait=0):
+        deadline = time.monotonic() + wait
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            while True:
+                events = [e for e in job.events if e['seq'] > since]
+                remaining = deadline - time.monotonic()
+                if events or job.status in FINISHED_STATES or remaining <= 0:
+                    return {'status': job.status, 'events': events}
+                self._cond.wait(timeout=remaining)
+
+    # ----- jobs -----
+    def list_jobs(self):
+        with self._cond:
+            return [job.summary() for job in self.jobs.values()]
+
+    def submit(self, kind, params):
+        if not isinstance(params, dict):
+            raise ValueError("Job parameters must be a JSON object")
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if kind == 'playlist' and not isinstance(params.get('url'), str):
+            raise ValueError("A playlist job needs a 'url'")
+        for name in ('output_dir', 'quality', 'bandwidth_limit'):
+            if params.get(name) is not None and not isinstance(params[name], (str, int)):
+                raise ValueError(f"'{name}' must be a string")
+        if params.get('bandwidth_limit') is not None:
+            parse_rate(params['bandwidth_limit'])
+        renditions = params.get('renditions') or []
+        if not isinstance(renditions, list) or not all(isinstance(r, dict) for r in renditions):
+            raise ValueError("'renditions' must be a list of {\"format\", \"bitrate\", \"target_dir\"} objects")
+        try:
+            renditions = [Rendition.from_dict(r) for r in renditions]
+            if kind in ('playlist', 'demo'):
+                # Checked here so a bad combination is refused up front instead of failing every track
+                if not renditions:
+                    renditions = [Rendition('mp3', params.get('quality', '320'))] + parse_renditions(EXTRA_RENDITIONS)
+                check_renditions(renditions, params.get('output_dir') or DEFAULT_DOWNLOAD_DIR)
+        except TypeError:
+            raise ValueError("Invalid rendition: format, bitrate and target_dir must be strings") from None
+        job = Job(kind, params)
+        with self._cond:
+            self.jobs[job.id] = job
+            self._queue.append(job)
+            self._prune()
+            self._cond.notify_all()
+        self._emit('status', 'queued', job)
+        return job
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status in FINISHED_STATES:
+                return job
+            job.cancel_event.set()
+            if job.status == 'queued':
+                self._queue.remove(job)
+                job.status = 'cancelled'
+                job.finished_at = time.time()
+        self._emit('status', job.status if job.status == 'cancelled' else 'cancelling', job)
+        return job
+
+    def _prune(self):
+        finished = [j for j in self.jobs.values() if j.status in FINISHED_STATES]
+        for job in sorted(finished, key=lambda j: j.created_at)[:-MAX_FINISHED_JOBS or None]:
+            del self.jobs[job.id]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                job.status = 'running'
+                job.started_at = time.time()
+                self._current = job
+            self._emit('status', 'running', job)
+
+            try:
+                ok = self._execute(job)
+                status = 'cancelled' if job.cancel_event.is_set() else ('done' if ok is not False else 'failed')
+            except Exception as e:
+                job.error = str(e)
+                self._emit('log', f"Job failed: {e}", job)
+                status = 'failed'
+
+            self._flush_statuses()
+            with self._cond:
+                job.status = status
+                job.finished_at = time.time()
+                self._current = None
+            self._emit('status', status, job)
+
+    @staticmethod
+    def _execute(job):
+        import downloader
+
+        params = job.params
+        quality = str(params.get('quality', '320'))
+        output_dir = params.get('output_dir') or DEFAULT_DOWNLOAD_DIR
+        renditions = [Rendition.from_dict(r) for r in params.get('renditions') or []] or None
+        if job.kind == 'playlist':
+            return downloader.process_spotify_playlist(
+                params['url'], quality, output_dir, job.cancel_event, params.get('bandwidth_limit'), renditions,
+                bool(params.get('force_retry'))
+            )
+        if job.kind == 'demo':
+            return downloader.process_demo_playlist(
+                quality, output_dir, job.cancel_event, params.get('bandwidth_limit'), renditions
+            )
+        if job.kind == 'verify':
+            # Bad files are fetched again at their own bitrate unless a quality is given
+            return downloader.verify_library(
+                output_dir, params.get('quality'), params.get('redownload', True), cancel_event=job.cancel_event
+            )
+        return downloader.retag_library(
+            output_dir, bool(params.get('refresh_artwork')), cancel_event=job.cancel_event
+        )
+
+
+# ========== HTTP API ==========
+def write_token(path=SERVICE_TOKEN_FILE):
+    token = secrets.token_urlsafe(32)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.unlink(missing_ok=True)
+    # Created with owner-only permissions so the token is never readable by others
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token)
+    os.replace(tmp, path)
+    return token
+
+
+def read_token(path=SERVICE_TOKEN_FILE):
+    try:
+        return Path(path).read_text().strip()
+    except OSError:
+        return None
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    service = None
+    token = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        return parts, {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+    def _rejected(self, public=False):
+        """Send an error and return True unless the request may use the API"""
+        if self.headers.get('Origin') is not None:
+            self._send(403, {'error': 'cross-origin requests are not allowed'})
+            return True
+        if public:
+            return False
+        if not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ''), self.token or ''):
+            self._send(401, {'error': f'missing or invalid {TOKEN_HEADER}'})
+            return True
+        return False
+
+    def do_GET(self):
+        parts, query = self._route()
+        if self._rejected(public=parts == ['health']):
+            return
+        if parts == ['health']:
+            return self._send(200, {'status': 'ok', 'pid': os.getpid()})
+        if parts == ['jobs']:
+            return self._send(200, {'jobs': self.service.list_jobs()})
+        if len(parts) == 2 and parts[0] == 'jobs':
+            job = self.service.jobs.get(parts[1])
+            return self._send(200, job.summary()) if job else self._send(404, {'error': 'job not found'})
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+            try:
+                since = int(query.get('since', 0))
+                wait = min(float(query.get('wait', 0)), 30)
+            except ValueError:
+                return self._send(400, {'error': 'invalid since/wait'})
+            result = self.service.events(parts[1], since, wait)
+            return self._send(200, result) if result else self._send(404, {'error': 'job not found'})
+        self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if self._rejected():
+            return
+        if parts != ['jobs']:
+            return self._send(404, {'error': 'not found'})
+        if self.headers.get_content_type() != 'application/json':
+            return self._send(415, {'error': 'Content-Type must be application/json'})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("Request body must be a JSON object")
+            kind = body.pop('kind', 'playlist')
+            job = self.service.submit(kind, body)
+        except (ValueError, json.JSONDecodeError) as e:
+            return self._send(400, {'error': str(e)})
+        self._send(201, job.summary())
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if self._rejected():
+            return
+        if len(parts) == 2 and parts[0] == 'jobs':
+            job = self.service.cancel(parts[1])
+            return self._send(200, job.summary()) if job else self._send(404, {'error': 'job not found'})
+        self._send(404, {'error': 'not found'})
+
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT):
+    service = DownloadService()
+    service.start()
+    handler = type('BoundServiceHandler', (ServiceHandler,), {'service': service, 'token': write_token()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    print(f"Download service listening on http://{host}:{port}")
+    server.serve_forever()
+
+
+# ========== Client ==========
+class ServiceError(Exception):
+    pass
+
+
+class ServiceClient:
+    """Thin client used by the GUI and scripts; starts the service on first use"""
+
+    def __init__(self, host=SERVICE_HOST, port=SERVICE_PORT, timeout=5):
+        self.base_url = f"http://{host}:{port}"
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def _request(self, method, path, timeout=None, **kwargs):
+        # Read on every request, since a restarted service writes a new token
+        headers = {TOKEN_HEADER: read_token() or ''}
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=timeout or self.timeout,
+                                            headers=headers, **kwargs)
+        except requests.RequestException as e:
+            raise ServiceError(f"Download service unavailable: {e}") from e
+        if response.status_code >= 400:
+            try:
+                message = response.json().get('error')
+            except ValueError:
+                message = response.text
+            raise ServiceError(message or f"HTTP {response.status_code}")
+        return response.json()
+
+    def is_running(self):
+        try:
+            return self.session.get(self.base_url + '/health', timeout=1).ok
+        except requests.RequestException:
+            return False
+
+    def ensure_running(self, timeout=20):
+        if self.is_running():
+            return
+        kwargs = {}
+        if sys.platform == 'win32':
+            kwargs['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs['start_new_session'] = True
+        service_script = Path(__file__).resolve()
+        subprocess.Popen(
+            [sys.executable, str(service_script)],
+            cwd=str(service_script.parent),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            **kwargs
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.is_running():
+                return
+            time.sleep(0.2)
+        raise ServiceError("Download service did not start")
+
+    def submit(self, kind, **params):
+        return self._request('POST', '/jobs', json=dict(params, kind=kind))
+
+    def jobs(self):
+        return self._request('GET', '/jobs')['jobs']
+
+    def job(self, job_id):
+        return self._request('GET', f'/jobs/{job_id}')
+
+    def cancel(self, job_id):
+        return self._request('DELETE', f'/jobs/{job_id}')
+
+    def events(self, job_id, since=0, wait=0):
+        return self._request('GET', f'/jobs/{job_id}/events', params={'since': since, 'wait': wait},
+                             timeout=self.timeout + wait)
+
+    def watch(self, job_id):
+        """Yield events until the job finishes"""
+        since = 0
+        while True:
+            result = self.events(job_id, since, wait=25)
+            for event in result['events']:
+                since = event['seq']
+                yield event
+            if result['status'] in FINISHED_STATES and not result['events']:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local download service")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    args = parser.parse_args()
+    serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
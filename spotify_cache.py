@@ -0,0 +1,177 @@
+"""
+Disk-backed cache for Spotify Web API responses.
+
+CachedSession is handed to spotipy as its requests session, so every GET made
+through the client (playlist/album pages, sp.next, bulk lookups) is served from
+a SQLite store while fresh and revalidated with If-None-Match once stale.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+# (url fragment, ttl seconds) - first match wins
+DEFAULT_TTLS = (
+    ('/playlists/', 60 * 60),
+    ('/albums/', 7 * 24 * 60 * 60),
+    ('/tracks', 7 * 24 * 60 * 60),
+    ('/artists/', 24 * 60 * 60),
+)
+DEFAULT_TTL = 24 * 60 * 60
+
+
+class ResponseCache:
+    """SQLite store of GET responses, safe to share between threads and processes"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, status INTEGER, headers TEXT, body BLOB, "
+                "etag TEXT, last_modified TEXT, expires_at REAL)"
+            )
+            self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, etag, last_modified, expires_at FROM responses WHERE key = ?",
+                (key,)
+            ).fetchone()
+        if not row:
+            return None
+        status, headers, body, etag, last_modified, expires_at = row
+        return {
+            'status': status,
+            'headers': json.loads(headers),
+            'body': body,
+            'etag': etag,
+            'last_modified': last_modified,
+            'expires_at': expires_at,
+        }
+
+    def put(self, key, response, ttl):
+        headers = {k: v for k, v in response.headers.items() if k.lower() in ('content-type', 'etag', 'last-modified')}
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, response.status_code, json.dumps(headers), response.content,
+                 response.headers.get('ETag'), response.headers.get('Last-Modified'), time.time() + ttl)
+            )
+            self._conn.commit()
+
+    def touch(self, key, ttl):
+        with self._lock:
+            self._conn.execute("UPDATE responses SET expires_at = ? WHERE key = ?", (time.time() + ttl, key))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+
+class CachedSession(requests.Session):
+    """requests.Session that caches successful GETs and paces outgoing calls"""
+
+    def __init__(self, cache_path, ttls=DEFAULT_TTLS, default_ttl=DEFAULT_TTL, max_requests_per_second=5.0):
+        super().__init__()
+        self.cache = ResponseCache(cache_path)
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.min_interval = 1.0 / max_requests_per_second if max_requests_per_second else 0
+        self._pace_lock = threading.Lock()
+        self._next_request_at = 0.0
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        # Same retry policy spotipy builds for its own session, plus 429 so
+        # urllib3 honours Spotify's Retry-After header.
+        retry = Retry(
+            total=3,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(['GET', 'POST', 'PUT', 'DELETE']),
+            status=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(max_retries=retry)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def ttl_for(self, url):
+        for fragment, ttl in self.ttls:
+            if fragment in url:
+                return ttl
+        return self.default_ttl
+
+    def request(self, method, url, params=None, headers=None, **kwargs):
+        if method.upper() != 'GET':
+            self._pace()
+            return super().request(method, url, params=params, headers=headers, **kwargs)
+
+        prepared = requests.Request('GET', url, params=params).prepare()
+        language = (headers or {}).get('Accept-Language', '')
+        key = f"{prepared.url}|{language}"
+        ttl = self.ttl_for(prepared.url)
+
+        cached = self.cache.get(key)
+        if cached and cached['expires_at'] > time.time():
+            self.hits += 1
+            return self._from_cache(cached, prepared)
+
+        headers = dict(headers or {})
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        self._pace()
+        response = super().request(method, url, params=params, headers=headers, **kwargs)
+
+        if response.status_code == 304 and cached:
+            self.revalidated += 1
+            self.cache.touch(key, ttl)
+            return self._from_cache(cached, prepared)
+
+        self.misses += 1
+        if response.status_code == 200:
+            self.cache.put(key, response, ttl)
+        return response
+
+    def _pace(self):
+        if not self.min_interval:
+            return
+        with self._pace_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + self.min_interval
+        if wait > 0:
+            time.sleep(wait)
+
+    @staticmethod
+    def _from_cache(cached, prepared):
+        response = requests.Response()
+        response.status_code = cached['status']
+        response.headers = CaseInsensitiveDict(cached['headers'])
+        response._content = cached['body']
+        response.encoding = 'utf-8'
+        response.url = prepared.url
+        response.request = prepared
+        return response
@@ -0,0 +1,115 @@
+"""
+Scratch space for in-progress downloads.
+
+yt-dlp fragments, .part files, the intermediate source file and the encoded MP3
+all live in a per-track directory under the scratch root (ideally local SSD or
+tmpfs). Only the finished, tagged file is published into the library.
+
+Admission (reserve/release) is kept separate from the directory handling so
+worker processes can all reserve against one ScratchSpace held by the parent.
+"""
+
+import errno
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# Rough size of the downloaded source stream, used with the output bitrate to
+# estimate how much scratch space a track needs.
+SOURCE_KBPS = 160
+DEFAULT_DURATION_SECONDS = 10 * 60
+SAFETY_FACTOR = 1.5
+
+
+def estimate_scratch_bytes(duration_ms, quality):
+    seconds = int(duration_ms) / 1000 if duration_ms else DEFAULT_DURATION_SECONDS
+    kbps = SOURCE_KBPS + int(quality)
+    return int(seconds * kbps * 1000 / 8 * SAFETY_FACTOR)
+
+
+class ScratchSpace:
+    """Hands out per-job directories, admitting a job only if its estimate fits"""
+
+    def __init__(self, root, min_free_bytes=256 * 1024 * 1024, admit_timeout=15 * 60):
+        self.root = Path(root).expanduser()
+        self.min_free_bytes = min_free_bytes
+        self.admit_timeout = admit_timeout
+        self._reserved = 0
+        self._cond = threading.Condition()
+
+    def free_bytes(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        return shutil.disk_usage(self.root).free
+
+    @contextmanager
+    def job(self, estimate):
+        self.reserve(estimate)
+        job_dir = None
+        try:
+            job_dir = Path(self.new_job_dir())
+            yield job_dir
+        finally:
+            if job_dir is not None:
+                shutil.rmtree(job_dir, ignore_errors=True)
+            self.release(estimate)
+
+    def new_job_dir(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        return tempfile.mkdtemp(prefix="job-", dir=self.root)
+
+    def reserve(self, estimate):
+        """Block until estimate bytes fit next to the other reservations, then hold them"""
+        deadline = time.monotonic() + self.admit_timeout
+        with self._cond:
+            while True:
+                available = self.free_bytes() - self._reserved - self.min_free_bytes
+                if available >= estimate:
+                    self._reserved += estimate
+                    return
+                # Nothing in flight to wait for: the job can never fit
+                remaining = deadline - time.monotonic()
+                if self._reserved == 0 or remaining <= 0:
+                    raise OSError(
+                        errno.ENOSPC,
+                        f"Not enough scratch space in {self.root}: "
+                        f"need {estimate // (1024 * 1024)} MB, {max(available, 0) // (1024 * 1024)} MB available"
+                    )
+                self._cond.wait(timeout=min(remaining, 5))
+
+    def release(self, estimate):
+        with self._cond:
+            self._reserved -= estimate
+            self._cond.notify_all()
+
+
+def publish_file(src, dest):
+    """Move a finished file into the library so it appears complete or not at all"""
+    src, dest = Path(src), Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.replace(src, dest)
+        return dest
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    # Different filesystem: copy next to the destination under a hidden name, then rename
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.{threading.get_ident()}.part")
+    try:
+        with open(src, 'rb') as fsrc, open(tmp, 'wb') as fdst:
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+            fdst.flush()
+            os.fsync(fdst.fileno())
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        raise
+    src.unlink()
+    return dest
@@ -0,0 +1,158 @@
+"""
+Model/view track table for the GUI.
+
+TrackTableModel holds the row list sent by the service as is (one
+[name, artist, album] list per track) plus one status string per row. It
+never creates widgets, and the view only asks for the rows that are visible,
+so 50k-track jobs stay cheap. Status updates arrive in batches. Each batch
+produces one dataChanged signal per run of adjacent rows.
+
+Sorting is done in the model with a plain list sort, which is far faster than
+letting the proxy call data() for every comparison. TrackFilterProxy then only
+filters, by status group and by a text search.
+"""
+
+from collections import Counter
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Qt
+from PyQt5.QtGui import QColor
+
+COLUMNS = ('#', 'Title', 'Artist', 'Album', 'Status', 'Detail')
+STATUS_COLUMN = COLUMNS.index('Status')
+DETAIL_COLUMN = COLUMNS.index('Detail')
+STATUS_ORDER = {'failed': 0, 'skipped': 1, 'active': 2, 'pending': 3, 'done': 4}
+STATUS_COLORS = {'failed': QColor('#d13438'), 'skipped': QColor('#b35c00'), 'done': QColor('#107c10')}
+STATUS_FILTERS = {
+    'All tracks': None,
+    'Failed only': {'failed', 'skipped'},
+    'Pending': {'pending', 'active'},
+    'Done': {'done'},
+}
+
+
+class TrackTableModel(QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []
+        self._status = []
+        self._detail = {}
+        self._order = []
+        self._position = []
+        self.counts = Counter()
+
+    # ----- updates -----
+    def set_tracks(self, rows):
+        self.beginResetModel()
+        self._rows = rows
+        self._status = ['pending'] * len(rows)
+        self._detail = {}
+        self._order = list(range(len(rows)))
+        self._position = list(self._order)
+        self.counts = Counter(pending=len(rows))
+        self.endResetModel()
+
+    def apply_updates(self, updates):
+        """Apply [track_index, status, detail] updates with one dataChanged per run of adjacent rows"""
+        changed = []
+        for track, status, detail in updates:
+            if not 0 <= track < len(self._rows):
+                continue
+            self.counts[self._status[track]] -= 1
+            self.counts[status] += 1
+            self._status[track] = status
+            if detail:
+                self._detail[track] = detail
+            else:
+                self._detail.pop(track, None)
+            changed.append(self._position[track])
+
+        changed.sort()
+        start = None
+        for i, row in enumerate(changed):
+            if start is None:
+                start = row
+            if i + 1 == len(changed) or changed[i + 1] > row + 1:
+                self.dataChanged.emit(self.index(start, STATUS_COLUMN), self.index(row, DETAIL_COLUMN))
+                start = None
+
+    def status(self, row):
+        return self._status[self._order[row]]
+
+    def search_text(self, row):
+        return ' '.join(str(value) for value in self._rows[self._order[row]] if value).lower()
+
+    # ----- QAbstractTableModel -----
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        track = self._order[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return track + 1
+            if column == STATUS_COLUMN:
+                return self._status[track]
+            if column == DETAIL_COLUMN:
+                return self._detail.get(track, '')
+            return self._rows[track][column - 1]
+        if role == Qt.ForegroundRole and column == STATUS_COLUMN:
+            return STATUS_COLORS.get(self._status[track])
+        if role == Qt.ToolTipRole and column == DETAIL_COLUMN:
+            return self._detail.get(track)
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        if column == 0:
+            key = None
+        elif column == STATUS_COLUMN:
+            key = lambda t: STATUS_ORDER.get(self._status[t], len(STATUS_ORDER))
+        elif column == DETAIL_COLUMN:
+            key = lambda t: self._detail.get(t, '')
+        else:
+            key = lambda t: (self._rows[t][column - 1] or '').lower()
+
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        tracked = [(self._order[i.row()], i.column()) for i in persistent]
+        self._order.sort(key=key, reverse=order == Qt.DescendingOrder)
+        for row, track in enumerate(self._order):
+            self._position[track] = row
+        self.changePersistentIndexList(persistent, [self.index(self._position[t], c) for t, c in tracked])
+        self.layoutChanged.emit()
+
+
+class TrackFilterProxy(QSortFilterProxyModel):
+    """Filters by status group and search text; sorting is delegated to the source model"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._statuses = None
+        self._text = ''
+
+    def set_status_filter(self, name):
+        self._statuses = STATUS_FILTERS.get(name)
+        self.invalidateFilter()
+
+    def set_text_filter(self, text):
+        self._text = text.strip().lower()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        model = self.sourceModel()
+        if self._statuses is not None and model.status(source_row) not in self._statuses:
+            return False
+        return not self._text or self._text in model.search_text(source_row)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)
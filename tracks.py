@@ -0,0 +1,62 @@
+"""
+Compact track record shared by the downloader, the work queue and the GUI.
+
+Track uses __slots__ instead of a per-instance dict, stores numbers as ints and
+interns the strings that repeat across a playlist (artists, albums, cover
+URLs, release dates), so a 50k-track job holds one copy of each.
+"""
+
+import sys
+
+CSV_FIELDS = [
+    'name', 'artist', 'album', 'thumbnail_url', 'search_query', 'downloaded',
+    'id', 'isrc', 'duration_ms', 'track_number', 'disc_number', 'artists', 'release_date'
+]
+INT_FIELDS = ('duration_ms', 'track_number', 'disc_number')
+INTERNED_FIELDS = ('artist', 'album', 'thumbnail_url', 'artists', 'release_date')
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _to_int(value):
+    if value in (None, ''):
+        return None
+    return int(value)
+
+
+class Track:
+    __slots__ = tuple(CSV_FIELDS) + ('thumbnail_data',)
+
+    def __init__(self, name, artist, album, thumbnail_url=None, search_query=None, downloaded=False,
+                 id=None, isrc=None, duration_ms=None, track_number=None, disc_number=None,
+                 artists=None, release_date=None, thumbnail_data=None):
+        self.name = name
+        self.artist = _intern(artist)
+        self.album = _intern(album)
+        self.thumbnail_url = _intern(thumbnail_url)
+        self.search_query = search_query or f"{name} {artist}"
+        self.downloaded = downloaded
+        self.id = id
+        self.isrc = isrc
+        self.duration_ms = _to_int(duration_ms)
+        self.track_number = _to_int(track_number)
+        self.disc_number = _to_int(disc_number)
+        self.artists = _intern(artists)
+        self.release_date = _intern(release_date)
+        self.thumbnail_data = thumbnail_data
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a Track from a CSV/JSON row; empty strings become None"""
+        values = {field: (row.get(field) or None) for field in CSV_FIELDS}
+        downloaded = row.get('downloaded')
+        values['downloaded'] = downloaded is True or str(downloaded).lower() == 'true'
+        return cls(**values)
+
+    def to_row(self):
+        return {field: getattr(self, field) for field in CSV_FIELDS}
+
+    def __repr__(self):
+        return f"Track({self.name!r}, {self.artist!r}, {self.album!r})"
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+MP3 integrity checks that never decode audio.
+
+verify_mp3() reads three small pieces of a file:
+- the ID3v2 header, to find where the audio starts
+- the first MPEG frame, including its Xing/Info or VBRI header when present
+- the last few KB before any ID3v1 tag
+
+From these it checks:
+- the first frame header is valid
+- the stream is as long as the Xing/VBRI byte count says
+- the final frames chain exactly up to the end of the audio, so the last
+  frame is complete
+- the duration (from the frame count, or from the bitrate for CBR) is not
+  shorter than expected
+
+Any failure raises IntegrityError.
+
+    python verify.py /path/to/library              report bad files
+    python verify.py --requeue /path/to/library    also delete bad files listed in
+                                                   playlist.csv and download them again
+"""
+
+import argparse
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Allowed shortfall against the expected duration, matching the search tolerance
+DURATION_TOLERANCE_SECONDS = 10
+HEAD_BYTES = 4096
+TAIL_BYTES = 16 * 1024
+SYNC_SEARCH_BYTES = 64 * 1024
+MIN_TAIL_CHAIN = 3
+
+# Layer III bitrates in kbps by bitrate index, for MPEG-1 and for MPEG-2/2.5
+BITRATES = {
+    True: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    False: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Sample rates by the version bits of the header (3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5)
+SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+class IntegrityError(Exception):
+    """The file is truncated, corrupt or much shorter than expected"""
+
+
+class FrameHeader:
+    __slots__ = ('version', 'mpeg1', 'bitrate', 'sample_rate', 'samples', 'length', 'mono')
+
+    def __init__(self, version, bitrate, sample_rate, padding, mono):
+        self.version = version
+        self.mpeg1 = version == 3
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.samples = 1152 if self.mpeg1 else 576
+        self.length = self.samples // 8 * bitrate // sample_rate + padding
+        self.mono = mono
+
+    @property
+    def side_info_size(self):
+        if self.mpeg1:
+            return 17 if self.mono else 32
+        return 9 if self.mono else 17
+
+
+def parse_frame_header(data, offset=0):
+    """Decode a Layer III frame header at offset, or return None if there is none"""
+    if len(data) < offset + 4:
+        return None
+    b1, b2, b3 = data[offset + 1], data[offset + 2], data[offset + 3]
+    if data[offset] != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = (b1 >> 3) & 3
+    layer = (b1 >> 1) & 3
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    return FrameHeader(
+        version,
+        BITRATES[version == 3][bitrate_index] * 1000,
+        SAMPLE_RATES[version][rate_index],
+        (b2 >> 1) & 1,
+        (b3 >> 6) == 3,
+    )
+
+
+def _id3v2_size(head):
+    if head[:3] != b'ID3' or len(head) < 10:
+        return 0
+    size = 0
+    for byte in head[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _find_first_frame(data):
+    # A sync is only trusted when the next frame header follows where this one ends
+    for offset in range(len(data) - 4):
+        if data[offset] != 0xFF:
+            continue
+        frame = parse_frame_header(data, offset)
+        if frame is None:
+            continue
+        following = parse_frame_header(data, offset + frame.length)
+        if following is not None or offset + frame.length + 4 > len(data):
+            return offset, frame
+    return None, None
+
+
+def _vbr_header(data, offset, frame):
+    """(frames, bytes) from a Xing/Info or VBRI header in the first frame; either may be None"""
+    xing = offset + 4 + frame.side_info_size
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+        pos = xing + 8
+        frames = byte_count = None
+        if flags & 1:
+            frames = struct.unpack('>I', data[pos:pos + 4])[0]
+            pos += 4
+        if flags & 2:
+            byte_count = struct.unpack('>I', data[pos:pos + 4])[0]
+        return frames, byte_count
+    vbri = offset + 36
+    if data[vbri:vbri + 4] == b'VBRI':
+        byte_count, frames = struct.unpack('>II', data[vbri + 10:vbri + 18])
+        return frames, byte_count
+    return None, None
+
+
+def _tail_is_complete(tail, reference):
+    """True when a chain of frames in tail ends exactly at its last byte"""
+    for offset in range(len(tail) - 4):
+        if tail[offset] != 0xFF:
+            continue
+        frame = parse_frame_header(tail, offset)
+        if frame is None or frame.version != reference.version or frame.sample_rate != reference.sample_rate:
+            continue
+        pos, chained = offset, 0
+        while frame is not None and pos + frame.length <= len(tail):
+            pos += frame.length
+            chained += 1
+            frame = parse_frame_header(tail, pos)
+        if chained >= MIN_TAIL_CHAIN:
+            return pos == len(tail)
+    # Too few frames to judge (very short tail); the other checks decide
+    return True
+
+
+def verify_mp3(path, expected_seconds=None, tolerance=DURATION_TOLERANCE_SECONDS):
+    """Check an MP3 without decoding it; return its duration in seconds or raise IntegrityError"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        audio_start = _id3v2_size(f.read(10))
+        f.seek(audio_start)
+        head = f.read(SYNC_SEARCH_BYTES)
+        offset, frame = _find_first_frame(head)
+        if frame is None:
+            raise IntegrityError("no MPEG audio frames found")
+        audio_start += offset
+        head = head[offset:offset + HEAD_BYTES]
+
+        f.seek(max(audio_start, size - TAIL_BYTES - 128))
+        tail = f.read()
+    audio_end = size - 128 if tail[-128:-125] == b'TAG' else size
+    if audio_end != size:
+        tail = tail[:-128]
+    audio_bytes = audio_end - audio_start
+
+    frames, byte_count = _vbr_header(head, 0, frame)
+    if byte_count and audio_bytes < byte_count - frame.length:
+        raise IntegrityError(f"truncated: {audio_bytes} of {byte_count} audio bytes present")
+    if not _tail_is_complete(tail, frame):
+        raise IntegrityError("truncated: last frame is incomplete")
+
+    if frames:
+        duration = frames * frame.samples / frame.sample_rate
+    else:
+        duration = audio_bytes * 8 / frame.bitrate
+    if expected_seconds and duration < expected_seconds - tolerance:
+        raise IntegrityError(f"too short: {duration:.0f}s of {expected_seconds:.0f}s expected")
+    return duration
+
+
+def file_bitrate(path):
+    """Bitrate in kbps of the first frame, or None if it cannot be read"""
+    try:
+        with open(path, 'rb') as f:
+            f.seek(_id3v2_size(f.read(10)))
+            _, frame = _find_first_frame(f.read(SYNC_SEARCH_BYTES))
+    except OSError:
+        return None
+    return frame.bitrate // 1000 if frame else None
+
+
+def scan_files(paths, expected=None, max_workers=16):
+    """Verify files in parallel; yield (path, duration or None, error or None)
+
+    expected maps paths to expected seconds, either as a dict or as a function
+    that is called in the worker threads.
+    """
+    lookup = expected if callable(expected) else (expected or {}).get
+
+    def check(path):
+        try:
+            return path, verify_mp3(path, lookup(path)), None
+        except (IntegrityError, OSError) as e:
+            return path, None, str(e)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(check, paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check MP3 files for truncation without decoding them")
+    parser.add_argument('paths', nargs='+', help="MP3 files or folders to scan")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--requeue', action='store_true',
+                        help="Re-download bad tracks of each folder's playlist.csv")
+    args = parser.parse_args()
+
+    if args.requeue:
+        # Imported here so plain scans need neither Qt nor the download stack
+        from PyQt5.QtCore import Qt
+        from downloader import signals, verify_library
+        signals.log_signal.connect(print, Qt.DirectConnection)
+        for path in args.paths:
+            verify_library(path, max_workers=args.workers)
+        return
+
+    files = []
+    for path in map(Path, args.paths):
+        files.extend(sorted(path.rglob('*.mp3')) if path.is_dir() else [path])
+    bad = 0
+    for path, _, error in scan_files(files, max_workers=args.workers):
+        if error:
+            bad += 1
+            print(f"BAD  {path}: {error}")
+    print(f"{len(files)} files checked, {bad} bad")
+    raise SystemExit(1 if bad else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Shared work queue for running downloads across several processes or hosts.
+
+A coordinator resolves a Spotify playlist/album and enqueues one job per track
+in a SQLite file (put it on storage every node can reach). Workers lease jobs
+with a visibility timeout and keep them alive with heartbeats; a job whose
+worker dies becomes visible again once its lease expires.
+
+    python work_queue.py coordinator <spotify url> --queue /shared/jobs.sqlite --output /shared/music --wait
+    python work_queue.py worker --queue /shared/jobs.sqlite --concurrency 5
+"""
+
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PyQt5.QtCore import Qt
+
+from config import DEFAULT_DOWNLOAD_DIR, NEGATIVE_CACHE_TTL_HOURS
+from downloader import (
+    check_ffmpeg, download_from_youtube, job_bandwidth, job_renditions, resolve_spotify_tracks, sanitize_filename, save_playlist_to_csv,
+    load_playlist_from_csv, write_playlist_csv, signals
+)
+from failures import PERMANENT, DeadLetters, FatalError, classify
+from renditions import Rendition, parse_renditions
+from tracks import Track
+
+DEFAULT_VISIBILITY_TIMEOUT = 5 * 60
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class SQLiteWorkQueue:
+    """Job table with lease/heartbeat semantics; every state change is one short transaction"""
+
+    def __init__(self, path, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        # isolation_level=None: transactions are opened explicitly with BEGIN IMMEDIATE
+        self._conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "job_key TEXT UNIQUE, "
+            "payload TEXT NOT NULL, "
+            "status TEXT NOT NULL DEFAULT 'queued', "
+            "attempts INTEGER NOT NULL DEFAULT 0, "
+            "worker TEXT, "
+            "lease_expires REAL, "
+            "last_error TEXT, "
+            "updated_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires)")
+
+    def _transaction(self, func):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def put_many(self, jobs):
+        """Enqueue (key, payload) pairs; failed jobs with the same key are queued again"""
+        now = time.time()
+
+        def insert(conn):
+            for key, payload in jobs:
+                conn.execute(
+                    "INSERT INTO jobs (job_key, payload, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(job_key) DO UPDATE SET payload = excluded.payload, status = 'queued', "
+                    "attempts = 0, worker = NULL, lease_expires = NULL, updated_at = excluded.updated_at "
+                    "WHERE jobs.status = 'failed'",
+                    (key, json.dumps(payload), now)
+                )
+        self._transaction(insert)
+
+    def lease(self, worker_id, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+        """Claim the next visible job, or return None if there is nothing to do"""
+        now = time.time()
+
+        def claim(conn):
+            # Leases that ran out of attempts while their worker was gone are failed for good
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', last_error = 'lease expired', updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT id, payload FROM jobs WHERE status = 'queued' "
+                "OR (status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (worker_id, now + visibility_timeout, now, row[0])
+            )
+            return row[0], json.loads(row[1])
+        return self._transaction(claim)
+
+    def heartbeat(self, job_ids, worker_id, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT):
+        if not job_ids:
+            return
+        now = time.time()
+
+        def extend(conn):
+            conn.executemany(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? "
+                "WHERE id = ? AND worker = ? AND status = 'leased'",
+                [(now + visibility_timeout, now, job_id, worker_id) for job_id in job_ids]
+            )
+        self._transaction(extend)
+
+    def complete(self, job_id, worker_id):
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = 'done', lease_expires = NULL, last_error = NULL, updated_at = ? "
+            "WHERE id = ? AND worker = ?",
+            (time.time(), job_id, worker_id)
+        ))
+
+    def fail(self, job_id, worker_id, error, permanent=False):
+        """Requeue the job, or mark it failed once it has used up its attempts (at once if permanent)"""
+        max_attempts = 0 if permanent else self.max_attempts
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "worker = NULL, lease_expires = NULL, last_error = ?, updated_at = ? "
+            "WHERE id = ? AND worker = ?",
+            (max_attempts, str(error)[:1000], time.time(), job_id, worker_id)
+        ))
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {'queued': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+
+    def job_statuses(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT job_key, status FROM jobs").fetchall())
+
+
+def job_key(track, output_dir):
+    return f"{Path(output_dir).expanduser().resolve()}|{sanitize_filename(track.search_query)}"
+
+
+# ========== Coordinator ==========
+def run_coordinator(playlist_or_album_url, quality, output_dir, queue_path, wait=False, poll_interval=10,
+                    extra_renditions=None):
+    output_dir = Path(output_dir).expanduser().resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    renditions = [r.to_dict() for r in job_renditions(quality, extra_renditions, output_dir)]
+
+    tracks = resolve_spotify_tracks(playlist_or_album_url)
+    if not tracks:
+        return False
+
+    csv_path = save_playlist_to_csv(tracks, output_dir)
+    # Permanent failures stay out of the queue until their dead-letter entry expires
+    dead_letters = DeadLetters(output_dir, NEGATIVE_CACHE_TTL_HOURS)
+    pending = [track for track in tracks if not dead_letters.active(track)]
+    if len(pending) < len(tracks):
+        signals.log_signal.emit(f"Skipping {len(tracks) - len(pending)} tracks that failed permanently")
+    queue = SQLiteWorkQueue(queue_path)
+    queue.put_many([
+        (job_key(track, output_dir), {'track': track.to_row(), 'quality': str(quality),
+                                      'output_dir': str(output_dir), 'renditions': renditions})
+        for track in pending
+    ])
+    signals.log_signal.emit(f"Queued {len(pending)} tracks in {queue.path}")
+
+    if not wait:
+        return True
+
+    while True:
+        counts = queue.stats()
+        signals.log_signal.emit(
+            f"queued={counts['queued']} leased={counts['leased']} done={counts['done']} failed={counts['failed']}"
+        )
+        if not counts['queued'] and not counts['leased']:
+            break
+        time.sleep(poll_interval)
+
+    # Workers never touch playlist.csv on the shared share; fold the results in once here
+    statuses = queue.job_statuses()
+    rows = load_playlist_from_csv(csv_path)
+    for row in rows:
+        row.downloaded = statuses.get(job_key(row, output_dir)) == 'done'
+    write_playlist_csv(csv_path, rows)
+    return True
+
+
+# ========== Worker ==========
+def run_worker(queue_path, worker_id=None, concurrency=5, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT,
+               poll_interval=5, exit_when_empty=False, bandwidth_limit=None):
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    try:
+        check_ffmpeg()
+    except FatalError as e:
+        signals.log_signal.emit(f"Worker {worker_id} not started: {e}")
+        return False
+    queue = SQLiteWorkQueue(queue_path)
+    held = set()
+    held_lock = threading.Lock()
+    slots = threading.Semaphore(concurrency)
+    stopping = threading.Event()
+    shaper = job_bandwidth(bandwidth_limit)
+
+    def heartbeat_loop():
+        while not stopping.wait(visibility_timeout / 3):
+            with held_lock:
+                job_ids = list(held)
+            try:
+                queue.heartbeat(job_ids, worker_id, visibility_timeout)
+            except sqlite3.Error as e:
+                signals.log_signal.emit(f"Heartbeat failed: {e}")
+
+    def run_job(job_id, payload):
+        track = Track.from_row(payload['track'])
+        try:
+            renditions = [Rendition.from_dict(r) for r in payload.get('renditions') or []] or None
+            download_from_youtube(track, payload['quality'], payload['output_dir'],
+                                  shaper=shaper, renditions=renditions)
+            queue.complete(job_id, worker_id)
+            # Loaded per job: other workers write the same file on the shared folder
+            DeadLetters(payload['output_dir'], NEGATIVE_CACHE_TTL_HOURS).clear(track)
+        except Exception as e:
+            kind, reason = classify(e)
+            signals.log_signal.emit(f"Download error ({kind}): {reason}")
+            queue.fail(job_id, worker_id, reason, permanent=kind == PERMANENT)
+            if kind == PERMANENT:
+                DeadLetters(payload['output_dir'], NEGATIVE_CACHE_TTL_HOURS).record(track, reason)
+        finally:
+            with held_lock:
+                held.discard(job_id)
+            slots.release()
+
+    signals.log_signal.emit(f"Worker {worker_id} polling {queue.path}")
+    threading.Thread(target=heartbeat_loop, daemon=True).start()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            while True:
+                slots.acquire()
+                job = queue.lease(worker_id, visibility_timeout)
+                if job is None:
+                    slots.release()
+                    with held_lock:
+                        idle = not held
+                    if exit_when_empty and idle:
+                        counts = queue.stats()
+                        if not counts['queued'] and not counts['leased']:
+                            break
+                    time.sleep(poll_interval)
+                    continue
+                job_id, payload = job
+                with held_lock:
+                    held.add(job_id)
+                executor.submit(run_job, job_id, payload)
+    finally:
+        stopping.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distributed Spotify playlist downloads over a shared queue")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    coordinator = sub.add_parser('coordinator', help="Resolve a playlist/album and enqueue its tracks")
+    coordinator.add_argument('url')
+    coordinator.add_argument('--queue', required=True, help="Path of the shared SQLite queue file")
+    coordinator.add_argument('--output', default=DEFAULT_DOWNLOAD_DIR)
+    coordinator.add_argument('--quality', default='320')
+    coordinator.add_argument('--wait', action='store_true', help="Wait for the queue to drain and update playlist.csv")
+    coordinator.add_argument('--extra-renditions', help="e.g. mp3:128:/shared/mobile (default: EXTRA_RENDITIONS)")
+
+    worker = sub.add_parser('worker', help="Lease and download queued tracks")
+    worker.add_argument('--queue', required=True, help="Path of the shared SQLite queue file")
+    worker.add_argument('--concurrency', type=int, default=5)
+    worker.add_argument('--worker-id')
+    worker.add_argument('--visibility-timeout', type=int, default=DEFAULT_VISIBILITY_TIMEOUT)
+    worker.add_argument('--exit-when-empty', action='store_true')
+    worker.add_argument('--bandwidth-limit', help="Cap for this worker in bytes/s, e.g. 2M (default: JOB_BANDWIDTH_LIMIT)")
+
+    args = parser.parse_args()
+    signals.log_signal.connect(print, Qt.DirectConnection)
+
+    if args.command == 'coordinator':
+        try:
+            extra = parse_renditions(args.extra_renditions) if args.extra_renditions is not None else None
+            ok = run_coordinator(args.url, args.quality, args.output, args.queue, wait=args.wait, extra_renditions=extra)
+        except ValueError as e:
+            parser.error(str(e))
+        raise SystemExit(0 if ok else 1)
+    ok = run_worker(args.queue, args.worker_id, args.concurrency, args.visibility_timeout,
+                    exit_when_empty=args.exit_when_empty, bandwidth_limit=args.bandwidth_limit)
+    raise SystemExit(1 if ok is False else 0)
+
+
+if __name__ == "__main__":
+    main()